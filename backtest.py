@@ -0,0 +1,109 @@
+"""Historical backtest of the investment strategies over every rolling window of a return series."""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from batch_simulation import STRATEGY_NAMES, simulate_investment_strategies_batch
+from monte_carlo import percentile_bands
+
+RETURN_COLUMNS = ('year', 'equities', 'bonds')
+
+def load_market_returns(path):
+    """Load yearly historical returns from a CSV file.
+
+    The file needs the columns year, equities and bonds, with returns as
+    fractions (0.07 for 7%); an optional inflation column is used for real
+    results. Years must be consecutive.
+    """
+    returns = pd.read_csv(path)
+    missing = [column for column in RETURN_COLUMNS if column not in returns.columns]
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+    returns = returns.sort_values('year').set_index('year')
+    if returns.index.has_duplicates or (np.diff(returns.index.to_numpy()) != 1).any():
+        raise ValueError(f"{path}: years must be consecutive without gaps or duplicates")
+    return returns
+
+def cumulative_index(returns):
+    """Prefix products of (1 + r): index[t] is the growth of 1 over the first t years (index[0] = 1)."""
+    index = np.ones(len(returns) + 1)
+    np.cumprod(1 + np.asarray(returns, dtype=float), out=index[1:])
+    return index
+
+def portfolio_returns(returns, equity_share):
+    """Yearly returns of a portfolio rebalanced every year to `equity_share` in equities, the rest in bonds."""
+    return equity_share * returns['equities'].to_numpy(dtype=float) + (
+        1 - equity_share) * returns['bonds'].to_numpy(dtype=float)
+
+def rolling_windows(values, years):
+    """All `years`-long windows of a series as an (windows, years) view; no window is copied."""
+    values = np.asarray(values, dtype=float)
+    if len(values) < years:
+        raise ValueError(f"The return series covers {len(values)} years, fewer than the {years} to simulate")
+    return sliding_window_view(values, years)
+
+def backtest_strategies(returns, years=42, wealth_equity_share=1.0, saeule_3a_equity_share=None,
+                        terms='nominal', index_brackets=True, **simulation_params):
+    """Run every strategy over every rolling `years`-year window of historical returns.
+
+    Free wealth and the 3a accounts each hold a yearly rebalanced mix of
+    equities and bonds (the 3a mix defaults to the wealth mix). All windows are
+    simulated together as one batch; the per-year returns of a window are a
+    view into the series, and its annualized market return comes from the
+    prefix-product index in O(1). With an inflation column the price path of
+    each window is passed on as well, so terms='real' reports CHF of the
+    window's first year. In real and nominal runs alike the tax brackets then
+    move with that inflation, as they do by default in the batched
+    simulation; index_brackets=False keeps them at their year-1 values unless
+    bracket_indexation is given. Remaining keyword arguments go to
+    simulate_investment_strategies_batch.
+
+    Returns a DataFrame with one row per start year: the window, the annualized
+    returns of both portfolios and the final wealth plus remaining 3a of each
+    strategy (columns named as STRATEGY_NAMES).
+    """
+    if saeule_3a_equity_share is None:
+        saeule_3a_equity_share = wealth_equity_share
+    wealth_returns = portfolio_returns(returns, wealth_equity_share)
+    saeule_3a_returns = portfolio_returns(returns, saeule_3a_equity_share)
+    wealth_windows = rolling_windows(wealth_returns, years)
+    saeule_3a_windows = rolling_windows(saeule_3a_returns, years)
+    if 'inflation' in returns:
+        simulation_params.setdefault('inflation', rolling_windows(returns['inflation'], years))
+    if not index_brackets:
+        simulation_params.setdefault('bracket_indexation', 0.0)
+
+    result = simulate_investment_strategies_batch(
+        wealth_growth_rate=wealth_windows, saeule_3a_growth_rate=saeule_3a_windows, years=years,
+        terms=terms, record_history=False, **simulation_params)
+    final_wealth = result['Wealth'][:, :, -1] + result['Saeule_3a'][:, :, -1]
+
+    start_years = returns.index.to_numpy()[:len(wealth_windows)]
+    outcomes = pd.DataFrame({'Start_Year': start_years, 'End_Year': start_years + years - 1})
+    for label, series in (('Wealth_Return', wealth_returns), ('Saeule_3a_Return', saeule_3a_returns)):
+        index = cumulative_index(series)
+        outcomes[label] = (index[years:] / index[:-years]) ** (1 / years) - 1
+    for person, name in enumerate(STRATEGY_NAMES):
+        outcomes[name] = final_wealth[:, person]
+    return outcomes
+
+def summarize_backtest(outcomes, percentiles=(5, 25, 50, 75, 95)):
+    """Distribution of final wealth per strategy across start years.
+
+    Percentile bands and the mean as in Monte Carlo mode, plus the worst and
+    best start year and the share of windows in which the strategy ended with
+    the most.
+    """
+    final_wealth = outcomes[STRATEGY_NAMES].to_numpy()
+    summary = percentile_bands(final_wealth, percentiles)
+    summary['Worst_Start'] = outcomes['Start_Year'].to_numpy()[final_wealth.argmin(axis=0)]
+    summary['Best_Start'] = outcomes['Start_Year'].to_numpy()[final_wealth.argmax(axis=0)]
+    summary['Best_Share'] = np.bincount(final_wealth.argmax(axis=1), minlength=len(STRATEGY_NAMES)) / len(outcomes)
+    return summary
+
+def run_backtest(path, percentiles=(5, 25, 50, 75, 95), **kwargs):
+    """Backtest the strategies on the returns in a CSV file and summarize the outcomes.
+
+    Accepts the arguments of backtest_strategies.
+    """
+    return summarize_backtest(backtest_strategies(load_market_returns(path), **kwargs), percentiles)
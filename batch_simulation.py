@@ -0,0 +1,823 @@
+"""Batched simulation of all investment strategies for many parameter sets at once."""
+import numpy as np
+
+from investements_vs_saeule_3_a import (
+    YearIndexedHistory,
+    calculate_joint_total_tax_vectorized,
+    calculate_total_tax_vectorized,
+    calculate_saeule_3a_withdrawal_tax_vectorized,
+    contribution_limit_paths,
+)
+
+# Person axis of the batched state arrays
+STRATEGY_NAMES = ['Alice', 'Bob', 'Charly', 'Dominic', 'Emily', 'Alice_adjusted']
+ALICE, BOB, CHARLY, DOMINIC, EMILY, ALICE_ADJUSTED = range(len(STRATEGY_NAMES))
+
+# Withdrawal sources recorded in 'Withdrawal_Source'
+NO_WITHDRAWAL, FROM_3A, FROM_WEALTH = 0, 1, 2
+
+# Amounts reported in CHF of their year ('nominal') or of year 1 ('real')
+TERMS = ('nominal', 'real')
+MONEY_FIELDS = ('Wealth', 'Saeule_3a', 'Yearly_Tax', 'Cumulative_Tax', 'Withdrawal', 'From_3a', 'To_Wealth',
+                'Withdrawal_Balance', 'Withdrawal_Tax', '3a_Contribution', 'Saeule_3a_Accounts',
+                'Step_Wealth', 'Step_Saeule_3a', 'Spouse_Saeule_3a')
+# Balances at the end of the year (or step); the other money fields are flows during the year
+STOCK_FIELDS = ('Wealth', 'Saeule_3a', 'Saeule_3a_Accounts', 'Spouse_Saeule_3a', 'Step_Wealth', 'Step_Saeule_3a')
+
+def _scenario_count(*values):
+    """Determine the number of scenarios N from the leading axis of all parameters."""
+    shapes = [np.shape(value)[:1] for value in values]
+    return np.broadcast_shapes(*shapes)[0] if any(shapes) else 1
+
+def _per_scenario(value, n, dtype=float):
+    """Broadcast a scalar or (N,) parameter to shape (N,)."""
+    return np.broadcast_to(np.asarray(value, dtype=dtype), (n,)).copy()
+
+def _per_year(value, n, years):
+    """Broadcast a scalar, (N,) or (N, years) rate to shape (N, years)."""
+    value = np.asarray(value, dtype=float)
+    if value.ndim < 2:
+        value = np.broadcast_to(value, (n,))[:, None]
+    return np.broadcast_to(value, (n, years))
+
+def _repeated_sum(balance, count):
+    """Add `count` copies of balance one at a time, like sum() over accounts with equal balances."""
+    total = np.zeros_like(balance)
+    for copies in range(int(count.max(initial=0))):
+        total = np.where(copies < count, total + balance, total)
+    return total
+
+def _index_path(rate, n, years):
+    """Cumulative (N, years) index of a per-year growth rate; year 1 is 1 and year y grows by the rates before it."""
+    growth = 1 + _per_year(rate, n, years)
+    index = np.ones((n, years))
+    index[:, 1:] = np.cumprod(growth[:, :-1], axis=1)
+    return index
+
+def _step_compounding(growth_rate, ter, n, years, steps):
+    """Compounding within each year of `steps` equal sub-periods (e.g. 12 months).
+
+    `growth_rate` is a scalar, (N,) or (N, years) yearly return, compounded
+    evenly over the steps of its year, or an (N, years * steps) array of
+    per-step returns; the yearly TER is charged in equal parts every step.
+    Returns three (N, years, steps) arrays: the growth of a start-of-year
+    balance up to the end of each step, and the value by then of a yearly
+    amount of 1 paid in equal parts at the end of each step, with and without
+    the step's TER charged on the payment (as deposits are treated yearly).
+    The last step of each gives a whole year's compounding, so the yearly
+    loop applies it with one multiplication instead of `steps`.
+    """
+    rate = np.asarray(growth_rate, dtype=float)
+    step_ter = (1 - _per_scenario(ter, n)) ** (1 / steps)
+    if rate.ndim == 2 and rate.shape[1] == years * steps:
+        step_growth = 1 + rate.reshape(rate.shape[0], years, steps)
+    else:
+        step_growth = ((1 + _per_year(rate, n, years)) ** (1 / steps))[:, :, None]
+    factor = np.broadcast_to(step_ter[:, None, None] * step_growth, (n, years, steps))
+
+    balance = np.cumprod(factor, axis=2)
+    deposit_ter = np.empty((n, years, steps))
+    deposit = np.empty((n, years, steps))
+    with_ter, plain = np.zeros((n, years)), np.zeros((n, years))
+    for step in range(steps):
+        with_ter = with_ter * factor[:, :, step] + step_ter[:, None] / steps
+        plain = plain * factor[:, :, step] + 1 / steps
+        deposit_ter[:, :, step] = with_ter
+        deposit[:, :, step] = plain
+    return balance, deposit_ter, deposit
+
+def _segment_compounding(compounding, y, first, last):
+    """Compounding over steps first..last of year y, from the arrays of _step_compounding.
+
+    Returns three (N, last - first + 1) arrays: the growth of a balance held
+    from the start of step `first` up to the end of each step, and the value
+    by then of the payments of a yearly amount of 1 made in those steps, with
+    and without their TER.
+    """
+    paths = [path[:, y, first:last + 1] for path in compounding]
+    if first == 0:
+        return tuple(paths)
+    growth = paths[0] / compounding[0][:, y, first - 1:first]
+    return (growth,) + tuple(path - values[:, y, first - 1:first] * growth
+                             for path, values in zip(paths[1:], compounding[1:]))
+
+def _max_drawdown(paths, peak=None):
+    """Largest fall from the running peak along the last axis, as a fraction of the peak.
+
+    `peak` carries a running peak over from an earlier part of the path.
+    Returns the largest falls and the running peaks at the end.
+    """
+    peaks = np.maximum.accumulate(paths, axis=-1)
+    if peak is not None:
+        peaks = np.maximum(peaks, peak[..., None])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        falls = np.where(peaks > 0, 1 - paths / peaks, 0.0)
+    return falls.max(axis=-1), peaks[..., -1]
+
+def _compound(balance, factors):
+    """Multiply balance by each factor in turn (TER then growth yearly, or one factor per year of steps)."""
+    for factor in factors:
+        balance = balance * factor
+    return balance
+
+def simulate_investment_strategies_batch(initial_income=100000, initial_wealth=120000,
+                                         yearly_investment=20000, saeule_3a_contribution=7258,
+                                         wealth_growth_rate=0.04, saeule_3a_growth_rate=0.04,
+                                         wealth_ter=0.001, saeule_3a_ter=0.004, years=42, num_3a_accounts=11,
+                                         record_accounts=False, record_history=True, tax_tables=None,
+                                         municipality=None, contribution_seed=None, inflation=0.0,
+                                         wage_growth=0.0, bracket_indexation=None, terms='nominal',
+                                         steps_per_year=1, record_steps=False, household=False,
+                                         spouse_income=0, spouse_3a_contribution=7258, spouse_3a_accounts=None,
+                                         withdrawal_step=None):
+    """Simulate all strategies for N parameter sets at once.
+
+    Every parameter except `years` may be a scalar or an array of shape (N,).
+    The growth rates may also be (N, years) arrays of per-year returns. All
+    scenarios advance together year by year, following exactly the same rules as
+    simulate_investment_strategies. Row i of the result matches the scalar
+    function for the i-th parameter set; use batch_to_histories to get it back
+    in the scalar history format.
+
+    The open accounts of Alice, Charly, Dominic and Alice_adjusted always hold
+    equal balances, so each of them is tracked as one (N,) balance plus a count
+    of open accounts; only Emily's accounts need an (N, accounts) array.
+
+    Returns a dict of arrays with the person axis ordered as STRATEGY_NAMES.
+    Per-account balances are only kept when `record_accounts` is set, since
+    they need (N, persons, years, accounts) memory. With `record_history=False`
+    only the final year is kept, which bounds memory for large batches that
+    only need end results.
+
+    With `tax_tables` (a tax_tables.TaxTables) each scenario is taxed by the
+    tables of its `municipality` (BFS number or name, scalar or (N,)); without
+    a municipality every municipality of the tables is one scenario.
+
+    `contribution_seed` (scalar or (N,)) gives Alice_adjusted the rising
+    contribution limit path of contribution_limit_paths for that seed, one
+    independent random stream per scenario. In households the spouses use
+    the streams seed * 2 and seed * 2 + 1.
+
+    `inflation`, `wage_growth` and `bracket_indexation` (default: inflation)
+    are yearly rates, again scalars, (N,) or (N, years). The parameters give
+    year 1's amounts; income, the yearly investment and the 3a contribution
+    grow with wages, and the tax brackets, the wealth tax exemption and the
+    withdrawal tax thresholds move with the bracket index. Since the tax
+    schedules are progressive piecewise-linear, taxing x with brackets scaled
+    by b equals b times the tax on x / b, so the compiled tables are reused
+    every year. Growth rates stay nominal; with terms='real' every amount in
+    the result is in CHF of the start of year 1. Flows during year y (taxes,
+    contributions, withdrawals) are divided by 'Price_Index', the index at
+    the start of year y; balances (wealth, 3a and the step fields) are valued
+    at the end of their year or step and also include that year's inflation.
+    'Cumulative_Tax' is the sum of the deflated yearly taxes.
+
+    `steps_per_year` > 1 (e.g. 12 for months) splits every year into equal
+    steps: yearly returns and TERs compound per step, the growth rates may
+    also be (N, years * steps_per_year) arrays of per-step returns, and the
+    yearly investments and 3a contributions are paid in equal parts at the
+    end of each step (dollar-cost averaging). Taxes stay a yearly event at
+    the start of the year, and withdrawals keep their yearly timing (Alice,
+    Charly and Dominic before taxes, Bob and Emily after growth) unless
+    `withdrawal_step` moves all of them to the end of that step (0 to
+    steps_per_year - 1), between two growth phases of the year. The
+    compounding of each year is precomputed as arrays, so the loop still
+    runs once per year and the yearly fields keep their meaning. With
+    `record_steps` the wealth and 3a totals at the end of every step are
+    added as 'Step_Wealth' and 'Step_Saeule_3a' (N, persons,
+    years * steps_per_year), and the market drawdowns within each year as
+    'Wealth_Drawdown' and 'Saeule_3a_Drawdown'; see intra_year_drawdown.
+
+    With `household` every scenario is a married couple: the joint income
+    `initial_income + spouse_income` is taxed with the joint tariff, and each
+    spouse pays into their own 3a accounts (`saeule_3a_contribution` into
+    `num_3a_accounts`, `spouse_3a_contribution` into `spouse_3a_accounts`,
+    default: the same number), following the strategy's rules for every
+    account set. Wealth and the yearly investment belong to the household.
+    Both spouses' withdrawals of the same year are taxed together at the rate
+    of their sum. The per-spouse 3a state is simply twice as many rows, so
+    households run at the speed of single persons. Yearly fields hold
+    household totals; 'Spouse_Saeule_3a' (N, 2, persons, years) splits the 3a
+    totals by spouse. Per-account balances are not recorded for households.
+    """
+    if terms not in TERMS:
+        raise ValueError(f"Unknown terms '{terms}', expected one of {TERMS}")
+    steps = int(steps_per_year)
+    if steps < 1 or steps != steps_per_year:
+        raise ValueError(f"steps_per_year must be a positive integer, got {steps_per_year}")
+    if withdrawal_step is not None and withdrawal_step not in range(steps):
+        raise ValueError(f"withdrawal_step must be a step index from 0 to {steps - 1}, got {withdrawal_step}")
+
+    # Events of each year in order. By default Alice, Charly and Dominic withdraw before taxes and Bob
+    # and Emily after the year's growth; with withdrawal_step every withdrawal happens at the end of that
+    # step, between two growth phases. phases holds the (first, last) step of each growth event.
+    if withdrawal_step is None:
+        schedule = ('early_withdrawals', 'tax', 'growth', 'late_withdrawals')
+        phases = [(0, steps - 1)]
+    else:
+        schedule = ('tax', 'growth', 'early_withdrawals', 'late_withdrawals')
+        phases = [(0, withdrawal_step)]
+        if withdrawal_step < steps - 1:
+            schedule += ('growth',)
+            phases.append((withdrawal_step + 1, steps - 1))
+    stepped = steps > 1 or withdrawal_step is not None
+    if household and record_accounts:
+        raise ValueError("Per-account balances are not recorded in household mode")
+    if tax_tables is not None and municipality is None:
+        municipality = tax_tables.municipalities['bfs_number'].to_numpy()
+    n = _scenario_count(initial_income, initial_wealth, yearly_investment, saeule_3a_contribution,
+                        wealth_growth_rate, saeule_3a_growth_rate, wealth_ter, saeule_3a_ter,
+                        num_3a_accounts, municipality, contribution_seed, inflation, wage_growth,
+                        bracket_indexation, *((spouse_income, spouse_3a_contribution, spouse_3a_accounts)
+                                              if household else ()))
+    # Withdrawal taxes are computed on (N, spouses) amounts, with the household's total setting the rate
+    if tax_tables is not None:
+        positions = _per_scenario(tax_tables.index(municipality), n, dtype=int)
+
+        def calculate_tax(incomes, wealths):
+            return tax_tables.total_tax(incomes, wealths, positions[:, None], joint=household)
+
+        def calculate_withdrawal_tax(amounts, year_totals=None):
+            return tax_tables.withdrawal_tax(amounts, positions[:, None], year_totals)
+    else:
+        calculate_tax = calculate_joint_total_tax_vectorized if household else calculate_total_tax_vectorized
+        calculate_withdrawal_tax = calculate_saeule_3a_withdrawal_tax_vectorized
+
+    # Per-year scaling vectors; without any indexation the unscaled tax functions are used as they are
+    price_index = _index_path(inflation, n, years)
+    wage_index = _index_path(wage_growth, n, years)
+    bracket_index = price_index if bracket_indexation is None else _index_path(bracket_indexation, n, years)
+    indexed = not (np.all(wage_index == 1) and np.all(bracket_index == 1))
+    if indexed:
+        unindexed_tax, unindexed_withdrawal_tax = calculate_tax, calculate_withdrawal_tax
+
+        # bracket_scale is the current year's bracket index, set in the year loop
+        def calculate_tax(incomes, wealths):
+            scale = bracket_scale[:, None]
+            return unindexed_tax(incomes / scale, wealths / scale) * scale
+
+        def calculate_withdrawal_tax(amounts, year_totals=None):
+            scale = bracket_scale[:, None]
+            return unindexed_withdrawal_tax(amounts / scale,
+                                            None if year_totals is None else year_totals / scale) * scale
+
+    # The 3a state has one row per spouse: m = n rows for single persons, 2n (spouse-major per scenario)
+    # for households; household_total and household_any fold rows back into (n,) scenarios
+    spouses = 2 if household else 1
+    m = n * spouses
+
+    def per_spouse(first, second, dtype=float):
+        """Interleave (N,) values of both spouses into (m,) rows."""
+        if spouses == 1:
+            return _per_scenario(first, n, dtype)
+        return np.stack([_per_scenario(first, n, dtype), _per_scenario(second, n, dtype)], axis=1).ravel()
+
+    def per_row(values):
+        """Repeat per-scenario values (along the first axis) for every spouse's row."""
+        return values if spouses == 1 else np.repeat(values, spouses, axis=0)
+
+    def household_total(values):
+        return values if spouses == 1 else values.reshape((n, spouses) + values.shape[1:]).sum(axis=1)
+
+    def household_any(values):
+        return values if spouses == 1 else values.reshape(n, spouses).any(axis=1)
+
+    def withdrawal_tax(amounts):
+        """Withdrawal tax of each row's amount; a household's withdrawals of the year are taxed together."""
+        amounts = amounts.reshape(n, spouses)
+        if spouses == 1:
+            return calculate_withdrawal_tax(amounts).ravel()
+        return calculate_withdrawal_tax(amounts, amounts.sum(axis=1, keepdims=True)).ravel()
+
+    income = _per_scenario(initial_income, n)
+    if household:
+        income = income + _per_scenario(spouse_income, n)
+    investment = _per_scenario(yearly_investment, n)
+    contribution_3a = per_spouse(saeule_3a_contribution, spouse_3a_contribution)
+    wealth_ter = _per_scenario(wealth_ter, n)
+    saeule_3a_ter = _per_scenario(saeule_3a_ter, n)
+    num_accounts = per_spouse(num_3a_accounts, num_3a_accounts if spouse_3a_accounts is None else spouse_3a_accounts,
+                              dtype=int)
+    if not stepped:
+        wealth_growth = _per_year(wealth_growth_rate, n, years)
+        saeule_3a_growth = per_row(_per_year(saeule_3a_growth_rate, n, years))
+    else:
+        wealth_steps = _step_compounding(wealth_growth_rate, wealth_ter, n, years, steps)
+        saeule_3a_steps = _step_compounding(saeule_3a_growth_rate, saeule_3a_ter, n, years, steps)
+        saeule_3a_row_steps = tuple(per_row(path) for path in saeule_3a_steps)
+    saeule_3a_ter = per_row(saeule_3a_ter)
+    if contribution_seed is not None:
+        # Spouses draw from their own streams, seed * 2 + spouse; a single person's seed is used as it is
+        seeds = per_row(_per_scenario(contribution_seed, n, dtype=np.int64)) * spouses + np.tile(np.arange(spouses), n)
+        adjusted_limits = contribution_limit_paths(contribution_3a[:, None], years, seeds)
+
+    persons = len(STRATEGY_NAMES)
+    working_years = min(years, 36)
+    # Emily opens at most one extra account per growth phase of a working year, Dominic has 5
+    emily_columns = 1 + working_years * len(phases)
+    max_accounts = max(int(num_accounts.max(initial=1)), 5, emily_columns)
+    rows = np.arange(m)
+    account_idx = np.arange(max_accounts)
+    emily_idx = np.arange(emily_columns)
+
+    # State arrays; shared_balance holds the common balance of each person's open accounts
+    wealth = np.empty((n, persons))
+    wealth[:] = _per_scenario(initial_wealth, n)[:, None]
+    shared_balance = np.zeros((m, persons))
+    emily_accounts = np.zeros((m, emily_columns))
+    total_taxes = np.zeros((n, persons))
+    alice_withdrawn = np.zeros(m, dtype=int)
+    dominic_withdrawn = 0
+    emily_opened = np.ones(m, dtype=int)
+    emily_withdrawn = np.zeros(m, dtype=int)
+
+    # History arrays
+    recorded_years = years if record_history else 1
+    shape = (n, persons, recorded_years)
+    result = {
+        'Year': np.arange(1, years + 1) if record_history else np.array([years]),
+        'Terms': terms,
+        'Strategies': list(STRATEGY_NAMES),
+        'Num_3a_Accounts': num_accounts.reshape(n, spouses) if household else num_accounts,
+        'Wealth': np.zeros(shape),
+        'Saeule_3a': np.zeros(shape),
+        'Num_Accounts': np.zeros(shape, dtype=int),
+        'Active_Accounts': np.zeros(shape, dtype=int),
+        'Yearly_Tax': np.zeros(shape),
+        'Cumulative_Tax': np.zeros(shape),
+        'Withdrawal': np.zeros(shape),
+        'Withdrawal_Source': np.zeros(shape, dtype=np.int8),
+        'From_3a': np.zeros(shape),
+        'To_Wealth': np.zeros(shape),
+        'Withdrawal_Account': np.zeros((n, recorded_years), dtype=int),
+        'Withdrawal_Balance': np.zeros((n, recorded_years)),
+        'Withdrawal_Tax': np.zeros((n, recorded_years)),
+        '3a_Contribution': np.zeros((n, recorded_years)),
+    }
+    if record_accounts:
+        result['Saeule_3a_Accounts'] = np.zeros(shape + (max_accounts,))
+    if household:
+        result['Spouse_Saeule_3a'] = np.zeros((n, spouses, persons, recorded_years))
+    if record_steps:
+        result['Steps_Per_Year'] = steps
+        result['Step_Wealth'] = np.zeros((n, persons, recorded_years * steps))
+        result['Step_Saeule_3a'] = np.zeros((n, persons, recorded_years * steps))
+        result['Wealth_Drawdown'] = np.zeros(shape)
+        result['Saeule_3a_Drawdown'] = np.zeros(shape)
+
+    def saeule_3a_totals():
+        """Current 3a total of every person per row (spouse), summed in account order like sum()."""
+        totals = np.zeros((m, persons))
+        totals[:, ALICE] = _repeated_sum(shared_balance[:, ALICE], num_accounts - alice_withdrawn)
+        totals[:, CHARLY] = shared_balance[:, CHARLY]
+        totals[:, DOMINIC] = _repeated_sum(shared_balance[:, DOMINIC], np.full(m, 5 - dominic_withdrawn))
+        totals[:, ALICE_ADJUSTED] = _repeated_sum(shared_balance[:, ALICE_ADJUSTED], num_accounts)
+        emily_total = totals[:, EMILY]
+        for acc_idx in range(emily_columns):
+            emily_total += emily_accounts[:, acc_idx]
+        return totals
+
+    def record_step_paths(y, slot, working, segments, saeule_3a_end):
+        """Fill one year of step values and drawdowns from the balances around each growth phase.
+
+        `segments` holds the first and last step of every growth phase with
+        the wealth and 3a totals before and after it. A balance at the end of
+        step m is its value at the start of the phase times the growth up to
+        m plus the phase's deposits scaled to the share paid and grown by
+        then. Withdrawals land in the last step of the phase before them; the
+        last step of the year is the year-end value.
+
+        The drawdowns only follow the market: each phase starts from the
+        balance after the taxes and withdrawals before it, the end of a phase
+        is taken before the withdrawals after it, and a withdrawal lowers the
+        running peak in proportion to the balance it takes.
+        """
+        window = slice(slot * steps, (slot + 1) * steps)
+        paths = {'Step_Wealth': [], 'Step_Saeule_3a': []}
+        drawdowns = {'Step_Wealth': np.zeros((n, persons)), 'Step_Saeule_3a': np.zeros((n, persons))}
+        peaks = {}
+        for first, last, wealth_start, wealth_grown, saeule_3a_start, saeule_3a_grown in segments:
+            if not stepped:
+                balance_paths = (np.ones((n, 1)), np.ones((n, 1)))
+                deposit_paths = (np.ones((n, 1)),) * 3
+            else:
+                wealth_paths = _segment_compounding(wealth_steps, y, first, last)
+                saeule_3a_paths = _segment_compounding(saeule_3a_steps, y, first, last)
+                balance_paths = (wealth_paths[0], saeule_3a_paths[0])
+                deposit_paths = (wealth_paths[2], wealth_paths[1], saeule_3a_paths[1])
+            wealth_growth_path = np.repeat(balance_paths[0][:, None, :], persons, axis=1)
+            saeule_3a_growth_path = np.repeat(balance_paths[1][:, None, :], persons, axis=1)
+            if not working:
+                # Alice_adjusted's wealth and Emily's and Alice_adjusted's accounts stop growing in retirement
+                wealth_growth_path[:, ALICE_ADJUSTED] = 1
+                saeule_3a_growth_path[:, [EMILY, ALICE_ADJUSTED]] = 1
+            wealth_share = np.repeat((deposit_paths[0] / deposit_paths[0][:, -1:])[:, None, :], persons, axis=1)
+            wealth_share[:, BOB] = deposit_paths[1] / deposit_paths[1][:, -1:]
+            saeule_3a_share = (deposit_paths[2] / deposit_paths[2][:, -1:])[:, None, :]
+
+            for field, start, grown, growth_path, share in (
+                    ('Step_Wealth', wealth_start, wealth_grown, wealth_growth_path, wealth_share),
+                    ('Step_Saeule_3a', saeule_3a_start, saeule_3a_grown, saeule_3a_growth_path, saeule_3a_share)):
+                if paths[field]:
+                    # The previous phase ends with the withdrawals; its peak shrinks by the share taken
+                    previous_grown, peak = peaks[field]
+                    paths[field][-1][:, :, -1] = start
+                    with np.errstate(divide='ignore', invalid='ignore'):
+                        peak = np.where(previous_grown > 0, start * (peak / previous_grown), start)
+                else:
+                    peak = None
+                deposits = grown - start * growth_path[:, :, -1]
+                segment_paths = start[:, :, None] * growth_path + deposits[:, :, None] * share
+                fall, peak = _max_drawdown(np.concatenate([start[:, :, None], segment_paths], axis=2), peak)
+                np.maximum(drawdowns[field], fall, out=drawdowns[field])
+                peaks[field] = (grown, peak)
+                paths[field].append(segment_paths)
+
+        for field, end, drawdown_field in (('Step_Wealth', wealth, 'Wealth_Drawdown'),
+                                           ('Step_Saeule_3a', saeule_3a_end, 'Saeule_3a_Drawdown')):
+            year_paths = np.concatenate(paths[field], axis=2)
+            year_paths[:, :, -1] = end
+            result[field][:, :, window] = year_paths
+            result[drawdown_field][:, :, slot] = drawdowns[field]
+
+    for y, year in enumerate(range(1, years + 1)):
+        working = year < 37
+        if indexed:
+            bracket_scale = bracket_index[:, y]
+            current_income = income * wage_index[:, y] if working else np.zeros(n)
+            current_investment = investment * wage_index[:, y] if working else np.zeros(n)
+            current_3a = contribution_3a * per_row(wage_index[:, y]) if working else np.zeros(m)
+        else:
+            current_income = income if working else np.zeros(n)
+            current_investment = investment if working else np.zeros(n)
+            current_3a = contribution_3a if working else np.zeros(m)
+        adjusted_3a = adjusted_limits[:, y] if working and contribution_seed is not None else current_3a
+
+        # Without history a single slot is reused, so clear last year's withdrawals
+        slot = y if record_history else 0
+        if not record_history:
+            for field in ('Withdrawal', 'Withdrawal_Source', 'From_3a', 'To_Wealth',
+                          'Withdrawal_Account', 'Withdrawal_Balance', 'Withdrawal_Tax'):
+                result[field][..., slot] = 0
+
+        withdrawal = result['Withdrawal'][:, :, slot]
+        source = result['Withdrawal_Source'][:, :, slot]
+        from_3a = result['From_3a'][:, :, slot]
+        to_wealth = result['To_Wealth'][:, :, slot]
+
+        # Events of the year in order; a growth event compounds the next phase of steps
+        phase = 0
+        segments = []
+        for event in schedule:
+            if event == 'early_withdrawals':
+                # Alice closes one account per year from year 32 on
+                p1_withdrawal = np.zeros(n)
+                if year >= 32:
+                    # Balances are zero (and so untaxed) in rows without a withdrawal
+                    spouse_closing = alice_withdrawn < num_accounts
+                    balance = np.where(spouse_closing, shared_balance[:, ALICE], 0.0)
+                    spouse_withdrawal_tax = withdrawal_tax(balance)
+                    after_tax_amount = household_total(balance - spouse_withdrawal_tax)
+                    closing = household_any(spouse_closing)
+                    if working:
+                        wealth[:, ALICE] = np.where(closing, wealth[:, ALICE] + after_tax_amount, wealth[:, ALICE])
+
+                    account = np.where(spouse_closing, alice_withdrawn + 1, 0)
+                    result['Withdrawal_Account'][:, slot] = (account if spouses == 1
+                                                             else account.reshape(n, spouses).max(axis=1))
+                    result['Withdrawal_Balance'][:, slot] = household_total(balance)
+                    result['Withdrawal_Tax'][:, slot] = household_total(spouse_withdrawal_tax)
+                    source[:, ALICE] = np.where(closing, FROM_3A, NO_WITHDRAWAL)
+                    from_3a[:, ALICE] = np.where(closing, after_tax_amount, 0.0)
+                    to_wealth[:, ALICE] = np.where(closing & working, after_tax_amount, 0.0)
+                    p1_withdrawal = np.where(closing, after_tax_amount, 0.0)
+                    alice_withdrawn += spouse_closing
+                matched = p1_withdrawal > 0
+
+                # Charly withdraws her single account in year 37, later matches Alice from wealth
+                if year >= 37:
+                    if year == 37:
+                        charly_balance = shared_balance[:, CHARLY]
+                        charly_after_tax = household_total(charly_balance - withdrawal_tax(charly_balance))
+                        wealth[:, CHARLY] = np.where(matched, wealth[:, CHARLY] + (charly_after_tax - p1_withdrawal),
+                                                     wealth[:, CHARLY])
+                        from_3a[:, CHARLY] = np.where(matched, charly_after_tax, 0.0)
+                        to_wealth[:, CHARLY] = np.where(matched, charly_after_tax - p1_withdrawal, 0.0)
+                        source[:, CHARLY] = np.where(matched, FROM_3A, NO_WITHDRAWAL)
+                        shared_balance[per_row(matched), CHARLY] = 0
+                    else:
+                        wealth[:, CHARLY] = np.where(matched, wealth[:, CHARLY] - p1_withdrawal, wealth[:, CHARLY])
+                        source[:, CHARLY] = np.where(matched, FROM_WEALTH, NO_WITHDRAWAL)
+                    withdrawal[:, CHARLY] = np.where(matched, p1_withdrawal, 0.0)
+
+                # Dominic closes one of his 5 accounts per year in years 37-41
+                if 37 <= year <= 41 and dominic_withdrawn < 5:
+                    dominic_balance = shared_balance[:, DOMINIC]
+                    dominic_after_tax = household_total(dominic_balance - withdrawal_tax(dominic_balance))
+                    wealth[:, DOMINIC] += dominic_after_tax - p1_withdrawal
+                    withdrawal[:, DOMINIC] = p1_withdrawal
+                    from_3a[:, DOMINIC] = dominic_after_tax
+                    to_wealth[:, DOMINIC] = dominic_after_tax - p1_withdrawal
+                    source[:, DOMINIC] = FROM_3A
+                    dominic_withdrawn += 1
+                elif year == 42:
+                    wealth[:, DOMINIC] = np.where(matched, wealth[:, DOMINIC] - p1_withdrawal, wealth[:, DOMINIC])
+                    withdrawal[:, DOMINIC] = np.where(matched, p1_withdrawal, 0.0)
+                    source[:, DOMINIC] = np.where(matched, FROM_WEALTH, NO_WITHDRAWAL)
+            elif event == 'tax':
+                # Taxes for all persons in one call; Emily and Alice_adjusted are not taxed in retirement
+                household_3a = household_total(current_3a)
+                household_adjusted_3a = household_total(adjusted_3a)
+                taxable_income = np.empty((n, persons))
+                taxable_income[:] = (current_income - household_3a)[:, None]
+                taxable_income[:, BOB] = current_income
+                taxable_income[:, ALICE_ADJUSTED] = current_income - household_adjusted_3a
+                tax = calculate_tax(taxable_income, wealth)
+                if not working:
+                    tax[:, EMILY] = 0
+                    tax[:, ALICE_ADJUSTED] = 0
+                # In real terms the cumulative tax sums each year's tax in CHF of year 1
+                total_taxes += tax / price_index[:, y, None] if terms == 'real' else tax
+                wealth -= tax
+            elif event == 'growth':
+                # Growth of a balance over the phase and the value at its end of the deposits paid in it
+                first, last = phases[phase]
+                phase += 1
+                share = (last - first + 1) / steps
+                if not stepped:
+                    wealth_factors = (1 - wealth_ter, 1 + wealth_growth[:, y])
+                    wealth_deposit_ter, wealth_deposit = 1 - wealth_ter, np.ones(n)
+                    saeule_3a_factors = (1 - saeule_3a_ter, 1 + saeule_3a_growth[:, y])
+                    saeule_3a_deposit = 1 - saeule_3a_ter
+                else:
+                    wealth_paths = _segment_compounding(wealth_steps, y, first, last)
+                    saeule_3a_paths = _segment_compounding(saeule_3a_row_steps, y, first, last)
+                    wealth_factors = (wealth_paths[0][:, -1],)
+                    wealth_deposit_ter, wealth_deposit = wealth_paths[1][:, -1], wealth_paths[2][:, -1]
+                    saeule_3a_factors = (saeule_3a_paths[0][:, -1],)
+                    saeule_3a_deposit = saeule_3a_paths[1][:, -1]
+
+                # Säule 3a growth and contributions, once per person for all equal open accounts
+                alice_active_count = num_accounts - alice_withdrawn
+                dominic_active_count = 5 - dominic_withdrawn
+                if working:
+                    alice_per_account = np.where(alice_active_count > 0,
+                                                 current_3a / np.maximum(alice_active_count, 1), 0.0)
+                else:
+                    alice_per_account = np.zeros(m)
+                if record_steps:
+                    wealth_start, saeule_3a_start = wealth.copy(), household_total(saeule_3a_totals())
+                shared_balance[:, ALICE] = (_compound(shared_balance[:, ALICE], saeule_3a_factors)
+                                            + alice_per_account * saeule_3a_deposit)
+
+                # Charly's account stays active (and keeps growing) after her withdrawal
+                shared_balance[:, CHARLY] = (_compound(shared_balance[:, CHARLY], saeule_3a_factors)
+                                             + current_3a / 1 * saeule_3a_deposit)
+
+                if dominic_active_count > 0:
+                    shared_balance[:, DOMINIC] = (
+                        _compound(shared_balance[:, DOMINIC], saeule_3a_factors)
+                        + current_3a / dominic_active_count * saeule_3a_deposit)
+
+                if working:
+                    # Emily grows her open accounts, then fills the newest one up to 50k with the phase's payments
+                    emily_3a, emily_deposit = current_3a * share, saeule_3a_deposit / share
+                    emily_active = emily_idx < emily_opened[:, None]
+                    grown = _compound(emily_accounts, [factor[:, None] for factor in saeule_3a_factors])
+                    np.copyto(emily_accounts, grown, where=emily_active)
+                    current_account = emily_opened - 1
+                    current_balance = emily_accounts[rows, current_account]
+                    remaining_space = 50000 - current_balance
+                    has_space = remaining_space > 0
+                    contribution = np.minimum(emily_3a, remaining_space)
+                    emily_accounts[rows, current_account] = np.where(
+                        has_space, current_balance + contribution * emily_deposit, current_balance)
+                    remaining_contribution = emily_3a - contribution
+                    open_new = np.where(has_space, remaining_contribution > 0, True)
+                    new_balance = np.where(has_space, remaining_contribution, emily_3a) * emily_deposit
+                    emily_accounts[rows[open_new], emily_opened[open_new]] = new_balance[open_new]
+                    emily_opened += open_new
+
+                    # Alice_adjusted keeps all accounts until the end
+                    adjusted_per_account = np.where(num_accounts > 0, adjusted_3a / np.maximum(num_accounts, 1),
+                                                    0.0)
+                    shared_balance[:, ALICE_ADJUSTED] = (
+                        _compound(shared_balance[:, ALICE_ADJUSTED], saeule_3a_factors)
+                        + adjusted_per_account * saeule_3a_deposit)
+
+                # Apply TER and growth to regular wealth
+                grows = [ALICE, BOB, CHARLY, DOMINIC, EMILY] + ([ALICE_ADJUSTED] if working else [])
+                if record_steps:
+                    saeule_3a_grown = household_total(saeule_3a_totals())
+                wealth[:, grows] = _compound(wealth[:, grows], [factor[:, None] for factor in wealth_factors])
+                wealth[:, BOB] += current_investment * wealth_deposit_ter
+                if working:
+                    alice_investment = np.where(household_3a > 0, current_investment - household_3a,
+                                                current_investment)
+                    wealth[:, ALICE] += alice_investment * wealth_deposit
+                    for person in (CHARLY, DOMINIC, EMILY):
+                        wealth[:, person] += (current_investment - household_3a) * wealth_deposit
+                    wealth[:, ALICE_ADJUSTED] += (current_investment - household_adjusted_3a) * wealth_deposit
+                else:
+                    for person in (ALICE, CHARLY, DOMINIC):
+                        wealth[:, person] += current_investment * wealth_deposit
+                if record_steps:
+                    segments.append((first, last, wealth_start, wealth.copy(), saeule_3a_start, saeule_3a_grown))
+            else:
+                # Bob matches Alice's withdrawals from his wealth
+                if year >= 37:
+                    wealth[:, BOB] = np.where(matched, wealth[:, BOB] - p1_withdrawal, wealth[:, BOB])
+                    withdrawal[:, BOB] = np.where(matched, p1_withdrawal, 0.0)
+                    source[:, BOB] = np.where(matched, FROM_WEALTH, NO_WITHDRAWAL)
+
+                # Emily withdraws one account per retirement year, then matches Alice from wealth
+                if not working:
+                    spouse_closing = emily_withdrawn < emily_opened
+                    closing_idx = np.minimum(emily_withdrawn, emily_columns - 1)
+                    emily_balance = np.where(spouse_closing, emily_accounts[rows, closing_idx], 0.0)
+                    emily_after_tax = household_total(emily_balance - withdrawal_tax(emily_balance))
+                    emily_closing = household_any(spouse_closing)
+                    from_wealth = ~emily_closing & matched
+                    wealth[:, EMILY] = np.where(
+                        emily_closing, wealth[:, EMILY] + (emily_after_tax - p1_withdrawal),
+                        np.where(from_wealth, wealth[:, EMILY] - p1_withdrawal, wealth[:, EMILY]))
+                    withdrawal[:, EMILY] = np.where(emily_closing | from_wealth, p1_withdrawal, 0.0)
+                    from_3a[:, EMILY] = np.where(emily_closing, emily_after_tax, 0.0)
+                    to_wealth[:, EMILY] = np.where(emily_closing, emily_after_tax - p1_withdrawal, 0.0)
+                    source[:, EMILY] = np.where(emily_closing, FROM_3A,
+                                                np.where(from_wealth, FROM_WEALTH, NO_WITHDRAWAL))
+                    emily_accounts[rows[spouse_closing], closing_idx[spouse_closing]] = 0
+                    emily_withdrawn += spouse_closing
+
+        # Store history for all persons (household totals)
+        spouse_saeule_3a = saeule_3a_totals()
+        saeule_3a_total = household_total(spouse_saeule_3a)
+        if household:
+            result['Spouse_Saeule_3a'][..., slot] = spouse_saeule_3a.reshape(n, spouses, persons)
+        if record_steps:
+            record_step_paths(y, slot, working, segments, saeule_3a_total)
+        result['Wealth'][:, :, slot] = wealth
+        result['Saeule_3a'][:, :, slot] = saeule_3a_total
+        result['Yearly_Tax'][:, :, slot] = tax
+        result['Cumulative_Tax'][:, :, slot] = total_taxes
+        result['3a_Contribution'][:, slot] = household_adjusted_3a
+
+        num_open = result['Num_Accounts'][:, :, slot]
+        num_open[:, ALICE] = household_total(num_accounts)
+        num_open[:, CHARLY] = spouses
+        num_open[:, DOMINIC] = 5 * spouses
+        num_open[:, EMILY] = household_total(emily_opened)
+        num_open[:, ALICE_ADJUSTED] = household_total(num_accounts)
+        active = result['Active_Accounts'][:, :, slot]
+        active[:, ALICE] = household_total(num_accounts - alice_withdrawn)
+        active[:, CHARLY] = spouses
+        active[:, DOMINIC] = (5 - dominic_withdrawn) * spouses
+        active[:, EMILY] = household_total(emily_opened - emily_withdrawn)
+        active[:, ALICE_ADJUSTED] = household_total(num_accounts)
+        if record_accounts:
+            accounts = result['Saeule_3a_Accounts'][:, :, slot]
+            for person, first, stop in ((ALICE, alice_withdrawn, num_accounts),
+                                        (CHARLY, 0, 1),
+                                        (DOMINIC, dominic_withdrawn, 5),
+                                        (ALICE_ADJUSTED, 0, num_accounts)):
+                open_accounts = ((account_idx >= np.reshape(first, (-1, 1)))
+                                 & (account_idx < np.reshape(stop, (-1, 1))))
+                accounts[:, person] = np.where(open_accounts, shared_balance[:, person, None], 0.0)
+            accounts[:, EMILY, :emily_columns] = emily_accounts
+
+    result['Price_Index'] = price_index if record_history else price_index[:, -1:]
+    if terms == 'real':
+        # Flows are deflated by the index at the start of their year, balances by the index at their date
+        year_inflation = 1 + _per_year(inflation, n, years)
+        step_index = (price_index[:, :, None]
+                      * year_inflation[:, :, None] ** (np.arange(1, steps + 1) / steps)).reshape(n, -1)
+        closing_index = step_index[:, steps - 1::steps]
+        if not record_history:
+            step_index, closing_index = step_index[:, -steps:], closing_index[:, -1:]
+        for field in MONEY_FIELDS:
+            if field not in result or field == 'Cumulative_Tax':
+                continue
+            values = result[field]
+            if field.startswith('Step_'):
+                deflator = step_index
+            elif field in STOCK_FIELDS:
+                deflator = closing_index
+            else:
+                deflator = result['Price_Index']
+            # Fields are (N, years), (N, persons, years), (N, persons, years, accounts) or (N, spouses, persons, years)
+            if field == 'Spouse_Saeule_3a':
+                result[field] = values / deflator[:, None, None, :]
+            elif values.ndim == 2:
+                result[field] = values / deflator
+            elif values.ndim == 3:
+                result[field] = values / deflator[:, None, :]
+            else:
+                result[field] = values / deflator[:, None, :, None]
+    return result
+
+def intra_year_drawdown(result, field='Step_Wealth'):
+    """Largest fall from a running peak within each year, as a fraction of the peak.
+
+    Needs a batch result run with `record_steps=True`; returns an array of
+    shape (N, persons, years) aligned with the yearly fields, so it can be
+    read next to 'Wealth' and 'Saeule_3a'. The peak restarts every year at the
+    balance after taxes and withdrawals, and withdrawals and taxes are not
+    counted as falls, so the drawdown measures market losses only (in nominal
+    terms). With step returns that stay positive after the TER, the drawdown
+    is zero.
+    """
+    drawdown_field = {'Step_Wealth': 'Wealth_Drawdown', 'Step_Saeule_3a': 'Saeule_3a_Drawdown'}[field]
+    if drawdown_field not in result:
+        raise ValueError(f"'{field}' is missing; run the batch with record_steps=True")
+    return result[drawdown_field]
+
+def batch_to_histories(result, row=0):
+    """Convert one row of a batch result into the tuple returned by simulate_investment_strategies.
+
+    Per-account balances are only included when the batch was run with
+    `record_accounts=True`, and only the final year when it was run with
+    `record_history=False`.
+    """
+    years = result['Year']
+    has_accounts = 'Saeule_3a_Accounts' in result
+
+    def value(field, person, y):
+        return result[field][row, person, y].item()
+
+    def account_list(person, y):
+        num_open = result['Num_Accounts'][row, person, y]
+        return result['Saeule_3a_Accounts'][row, person, y, :num_open].tolist()
+
+    histories = [YearIndexedHistory() for _ in STRATEGY_NAMES]
+    withdrawal_logs = {CHARLY: YearIndexedHistory(), DOMINIC: YearIndexedHistory(), EMILY: YearIndexedHistory()}
+    withdrawal_history = YearIndexedHistory()
+
+    for y, year in enumerate(years.tolist()):
+        if result['Withdrawal_Source'][row, ALICE, y] == FROM_3A:
+            withdrawal_history.append({
+                'Year': year,
+                'Account': result['Withdrawal_Account'][row, y].item(),
+                'Balance': result['Withdrawal_Balance'][row, y].item(),
+                'Tax': result['Withdrawal_Tax'][row, y].item(),
+                'After_Tax': value('From_3a', ALICE, y)
+            })
+        for person, log in withdrawal_logs.items():
+            source = result['Withdrawal_Source'][row, person, y]
+            if source == FROM_3A:
+                log.append({
+                    'Year': year,
+                    'Amount': value('Withdrawal', person, y),
+                    'From_3a': value('From_3a', person, y),
+                    'To_Wealth': value('To_Wealth', person, y)
+                })
+            elif source == FROM_WEALTH:
+                log.append({
+                    'Year': year,
+                    'Amount': value('Withdrawal', person, y),
+                    'From_Wealth': value('Withdrawal', person, y)
+                })
+
+        for person in (ALICE, ALICE_ADJUSTED):
+            entry = {
+                'Year': year,
+                'Wealth': value('Wealth', person, y),
+                'Saeule_3a': value('Saeule_3a', person, y),
+            }
+            if has_accounts:
+                entry['Saeule_3a_Accounts'] = account_list(person, y)
+            entry.update({
+                'Active_Accounts': result['Active_Accounts'][row, person, y].item(),
+                'Yearly_Tax': value('Yearly_Tax', person, y),
+                'Cumulative_Tax': value('Cumulative_Tax', person, y),
+                'Yearly_Withdrawal': 0
+            })
+            if person == ALICE_ADJUSTED:
+                entry['3a_Contribution'] = result['3a_Contribution'][row, y].item()
+            histories[person].append(entry)
+
+        histories[BOB].append({
+            'Year': year,
+            'Wealth': value('Wealth', BOB, y),
+            'Yearly_Tax': value('Yearly_Tax', BOB, y),
+            'Cumulative_Tax': value('Cumulative_Tax', BOB, y),
+            'Withdrawal': value('Withdrawal', BOB, y)
+        })
+
+        for person in (CHARLY, DOMINIC, EMILY):
+            entry = {
+                'Year': year,
+                'Wealth': value('Wealth', person, y),
+                'Saeule_3a': value('Saeule_3a', person, y),
+            }
+            if has_accounts and person != CHARLY:
+                entry['Saeule_3a_Accounts'] = account_list(person, y)
+            entry.update({
+                # The scalar loop reports Dominic's yearly tax for Charly as well
+                'Yearly_Tax': value('Yearly_Tax', DOMINIC if person == CHARLY else person, y),
+                'Cumulative_Tax': value('Cumulative_Tax', person, y),
+                'Withdrawal': value('Withdrawal', person, y)
+            })
+            histories[person].append(entry)
+
+    return (*histories, withdrawal_history,
+            withdrawal_logs[CHARLY], withdrawal_logs[DOMINIC], withdrawal_logs[EMILY])
@@ -0,0 +1,235 @@
+"""Benchmarks for the tax functions, the simulation and the reporting code, with baseline comparison."""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import platform
+import sys
+import timeit
+
+import numpy as np
+
+import investements_vs_saeule_3_a as model
+
+# Value ranges the tax functions are timed over (CHF)
+INCOME_RANGES = {'low': (0, 100000), 'mid': (100000, 500000), 'high': (500000, 5000000)}
+WEALTH_RANGES = {'low': (0, 100000), 'mid': (100000, 1000000), 'high': (1000000, 20000000)}
+SIMULATION_YEARS = (10, 20, 42, 60)
+SIMULATION_ACCOUNTS = (1, 11, 25)
+VALUES_PER_RANGE = 1000
+
+def _values(value_range, count=VALUES_PER_RANGE):
+    """Evenly spaced values over a range, as a list of floats."""
+    return np.linspace(*value_range, count).tolist()
+
+def _calls(function, *argument_lists):
+    """A benchmark body calling function once per argument tuple."""
+    arguments = list(zip(*argument_lists))
+
+    def run():
+        for args in arguments:
+            function(*args)
+    return run, len(arguments)
+
+def _quiet(function, *args, **kwargs):
+    """A benchmark body running function with stdout discarded."""
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            function(*args, **kwargs)
+    return run, 1
+
+def _plot(function, *args):
+    """A benchmark body building one figure and closing it again."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    def run():
+        function(*args)
+        plt.close('all')
+    return run, 1
+
+def tax_benchmarks():
+    """Per-call time of the scalar tax functions (and the vectorized total tax) per value range."""
+    for label, value_range in INCOME_RANGES.items():
+        incomes = _values(value_range)
+        yield f'calculate_income_tax[{label}]', _calls(model.calculate_income_tax, incomes)
+    for label, value_range in WEALTH_RANGES.items():
+        wealths = _values(value_range)
+        yield f'calculate_wealth_tax[{label}]', _calls(model.calculate_wealth_tax, wealths)
+    for label in INCOME_RANGES:
+        incomes, wealths = _values(INCOME_RANGES[label]), _values(WEALTH_RANGES[label])
+        yield f'calculate_total_tax[{label}]', _calls(model.calculate_total_tax, incomes, wealths)
+
+        income_array, wealth_array = np.array(incomes), np.array(wealths)
+        yield (f'calculate_total_tax_vectorized[{label}]',
+               (lambda: model.calculate_total_tax_vectorized(income_array, wealth_array), len(incomes)))
+    for label, value_range in (('low', (0, 100000)), ('high', (100000, 1000000))):
+        amounts = _values(value_range)
+        yield (f'calculate_saeule_3a_withdrawal_tax[{label}]',
+               _calls(model.calculate_saeule_3a_withdrawal_tax, amounts))
+
+def simulation_benchmarks():
+    """End-to-end simulate_investment_strategies time versus years and number of accounts."""
+    for years in SIMULATION_YEARS:
+        for num_accounts in SIMULATION_ACCOUNTS:
+            yield (f'simulate[years={years},accounts={num_accounts}]',
+                   (lambda years=years, num_accounts=num_accounts: model.simulate_investment_strategies(
+                       years=years, num_3a_accounts=num_accounts), 1))
+
+    def cached_simulation():
+        with model.cached_taxes():
+            model.simulate_investment_strategies()
+    yield 'simulate[tax cache]', (cached_simulation, 1)
+
+    from batch_simulation import simulate_investment_strategies_batch
+    num_accounts = np.arange(1, 1001) % 25 + 1
+    yield ('simulate_batch[per scenario]',
+           (lambda: simulate_investment_strategies_batch(num_3a_accounts=num_accounts), len(num_accounts)))
+    yield ('simulate_batch[household, per scenario]',
+           (lambda: simulate_investment_strategies_batch(num_3a_accounts=num_accounts, household=True,
+                                                         spouse_income=60000), len(num_accounts)))
+
+def reporting_benchmarks():
+    """print_comparison (tables only) and each plot builder."""
+    results = model.simulate_investment_strategies()
+    (p1_history, p2_history, p3_history, p4_history, p5_history, p6_history,
+     withdrawal_history, p3_withdrawals, p4_withdrawals, p5_withdrawals) = results
+    yield 'print_comparison', _quiet(model.print_comparison, *results, plot=False)
+    yield 'plot_retirement_phase', _plot(model.plot_retirement_phase, withdrawal_history, p2_history, p3_history,
+                                         p4_history, p5_history, p3_withdrawals, p4_withdrawals, p5_withdrawals)
+    yield 'plot_wealth_development', _plot(model.plot_wealth_development, *results[:6])
+    yield 'plot_final_years', _plot(model.plot_final_years, *results[:6])
+
+SUITES = {
+    'tax': tax_benchmarks,
+    'simulation': simulation_benchmarks,
+    'reporting': reporting_benchmarks,
+}
+
+def measure(function, calls, repeat=5, min_time=0.2):
+    """Best time per call over `repeat` runs, each run lasting at least about `min_time` seconds."""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number / calls
+
+def run_benchmarks(suites=None, select=None, repeat=5, min_time=0.2, progress=None):
+    """Run the selected suites and return {benchmark name: seconds per call}.
+
+    `select` keeps only benchmarks whose name contains the given substring.
+    """
+    results = {}
+    for suite in suites or SUITES:
+        for name, (function, calls) in SUITES[suite]():
+            if select and select not in name:
+                continue
+            results[name] = measure(function, calls, repeat=repeat, min_time=min_time)
+            if progress:
+                progress(name, results[name])
+    return results
+
+def compare(results, baseline, tolerance=0.2):
+    """Compare results with baseline timings.
+
+    Returns rows of (name, baseline, current, ratio, status) where status is
+    'regression' when a benchmark got slower by more than `tolerance`,
+    'faster' when it improved by more than `tolerance`, 'new' without a
+    baseline and 'ok' otherwise.
+    """
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            rows.append((name, None, current, None, 'new'))
+            continue
+        ratio = current / previous
+        if ratio > 1 + tolerance:
+            status = 'regression'
+        elif ratio < 1 - tolerance:
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, previous, current, ratio, status))
+    return rows
+
+def save_baseline(results, path):
+    """Store results with the environment they were measured in."""
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump({
+            'metadata': {
+                'created': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+            },
+            'results': results,
+        }, stream, indent=2)
+
+def load_baseline(path):
+    """Load the {benchmark name: seconds per call} timings of a stored baseline."""
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)['results']
+
+def _format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.2f} ns"
+
+def format_report(results, comparison=None):
+    """Format results (and an optional comparison) as a text table."""
+    lines = []
+    if comparison is None:
+        lines.append(f"{'Benchmark':<48} {'Per call':>11}")
+        lines.append("-" * 60)
+        for name, seconds in results.items():
+            lines.append(f"{name:<48} {_format_time(seconds):>11}")
+    else:
+        lines.append(f"{'Benchmark':<48} {'Baseline':>11} {'Current':>11} {'Ratio':>7}  Status")
+        lines.append("-" * 92)
+        for name, previous, current, ratio, status in comparison:
+            previous_text = _format_time(previous) if previous is not None else '-'
+            ratio_text = f"{ratio:7.2f}" if ratio is not None else '      -'
+            lines.append(f"{name:<48} {previous_text:>11} {_format_time(current):>11} {ratio_text}  {status}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tax functions, simulation and reporting.")
+    parser.add_argument('suites', nargs='*', metavar='SUITE',
+                        help=f"Suites to run (default: all of {', '.join(SUITES)})")
+    parser.add_argument('-k', dest='select', help="Only run benchmarks whose name contains this text")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2, help="Approximate seconds per timing run")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Store the results as a baseline")
+    parser.add_argument('--compare', metavar='PATH', help="Compare with a stored baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Relative slowdown that counts as a regression (default: 0.2)")
+    parser.add_argument('-o', '--output', help="Also write the report to this file")
+    args = parser.parse_args(argv)
+    unknown = [suite for suite in args.suites if suite not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite(s) {', '.join(unknown)}; choose from {', '.join(SUITES)}")
+
+    def progress(name, seconds):
+        print(f"  {name:<48} {_format_time(seconds):>11}", file=sys.stderr, flush=True)
+
+    results = run_benchmarks(args.suites or None, args.select, args.repeat, args.min_time, progress)
+    comparison = compare(results, load_baseline(args.compare), args.tolerance) if args.compare else None
+    report = format_report(results, comparison)
+    print(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            stream.write(report + "\n")
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+
+    regressions = [row[0] for row in comparison or [] if row[4] == 'regression']
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Break-even boundary of the Säule 3a advantage over a 2-D or 3-D parameter space."""
+import inspect
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from batch_simulation import ALICE, BOB, simulate_investment_strategies_batch
+
+BATCH_DEFAULTS = {name: parameter.default for name, parameter
+                  in inspect.signature(simulate_investment_strategies_batch).parameters.items()}
+# Derived axis: Säule 3a TER minus the TER of regular investments
+TER_DIFFERENCE = 'ter_difference'
+
+def saeule_3a_advantage(result):
+    """Total advantage of the Säule 3a strategy per scenario, as in summarize_simulation.
+
+    Bob's cumulative tax minus Alice's, plus Alice's final wealth and
+    remaining 3a minus Bob's final wealth.
+    """
+    tax_difference = result['Cumulative_Tax'][:, BOB, -1] - result['Cumulative_Tax'][:, ALICE, -1]
+    asset_difference = result['Wealth'][:, ALICE, -1] + result['Saeule_3a'][:, ALICE, -1] - result['Wealth'][:, BOB, -1]
+    return tax_difference + asset_difference
+
+class _AdvantageFunction:
+    """Säule 3a advantage for many parameter points per batched run, counting simulated scenarios."""
+
+    def __init__(self, params):
+        self.params = params
+        self.evaluations = 0
+
+    def __call__(self, values):
+        """Advantage for each point; `values` maps parameter (or axis) names to (N,) arrays."""
+        values = dict(values)
+        if TER_DIFFERENCE in values:
+            wealth_ter = values.get('wealth_ter', self.params.get('wealth_ter', BATCH_DEFAULTS['wealth_ter']))
+            values['saeule_3a_ter'] = wealth_ter + values.pop(TER_DIFFERENCE)
+        n = len(next(iter(values.values())))
+        self.evaluations += n
+        result = simulate_investment_strategies_batch(record_history=False, **{**self.params, **values})
+        return saeule_3a_advantage(result)
+
+def find_roots(function, lines, solve_for, bounds, scan_points=9, xtol=1e-6, max_iterations=60):
+    """Roots of function along `solve_for` within `bounds` for many lines at once.
+
+    `lines` maps the other parameters to (L,) arrays, one entry per line. Each
+    line is first sampled at `scan_points` evenly spaced values to bracket its
+    sign changes, then all brackets of all lines are narrowed together with the
+    Illinois variant of regula falsi, one batched evaluation per iteration.
+    Returns (line, root, direction) arrays, where direction is +1 when the
+    advantage turns positive as `solve_for` grows and -1 otherwise.
+    """
+    low, high = bounds
+    count = len(next(iter(lines.values()))) if lines else 1
+    grid = np.linspace(low, high, scan_points)
+    scan = {name: np.repeat(values, scan_points) for name, values in lines.items()}
+    scan[solve_for] = np.tile(grid, count)
+    samples = function(scan).reshape(count, scan_points)
+
+    # A bracket per sign change, and exact zeros on the scan grid as roots
+    signs = np.sign(samples)
+    zero_line, zero_index = np.nonzero(signs == 0)
+    bracket_line, bracket_index = np.nonzero(signs[:, :-1] * signs[:, 1:] < 0)
+    a, b = grid[bracket_index], grid[bracket_index + 1]
+    fa, fb = samples[bracket_line, bracket_index], samples[bracket_line, bracket_index + 1]
+    bracket_lines = {name: values[bracket_line] for name, values in lines.items()}
+
+    side = np.zeros(len(a), dtype=int)
+    for _ in range(max_iterations):
+        active = np.abs(b - a) > xtol
+        if not active.any():
+            break
+        x = np.where(active, (a * fb - b * fa) / (fb - fa), a)
+        values = {name: values[active] for name, values in bracket_lines.items()}
+        values[solve_for] = x[active]
+        fx = np.zeros(len(a))
+        fx[active] = function(values)
+
+        # Keep the bracket around the sign change; halve the stale end's value when it stays twice (Illinois)
+        left = active & (np.sign(fx) == np.sign(fa))
+        right = active & ~left
+        fb = np.where(left & (side == -1), fb / 2, fb)
+        fa = np.where(right & (side == 1), fa / 2, fa)
+        a, fa = np.where(left, x, a), np.where(left, fx, fa)
+        b, fb = np.where(right, x, b), np.where(right, fx, fb)
+        side = np.where(left, -1, np.where(right, 1, side))
+        # An exact zero closes the bracket
+        exact = active & (fx == 0)
+        a, b = np.where(exact, x, a), np.where(exact, x, b)
+
+    roots = np.concatenate([(a + b) / 2, grid[zero_index]])
+    directions = np.concatenate([
+        np.where(samples[bracket_line, bracket_index] < 0, 1, -1),
+        np.where(samples[zero_line, np.minimum(zero_index + 1, scan_points - 1)] > 0, 1, -1)])
+    line = np.concatenate([bracket_line, zero_line])
+    order = np.lexsort((roots, line))
+    return line[order], roots[order], directions[order]
+
+def break_even_surface(axes, solve_for, bounds, resolution=9, tolerance=None, max_refinements=5,
+                       scan_points=9, xtol=1e-6, max_iterations=60, **params):
+    """Map where the Säule 3a advantage is zero over a 2-D or 3-D parameter space.
+
+    `axes` maps one or two parameters to (low, high) ranges; they start on a
+    grid of `resolution` values each. For every grid line the break-even
+    value of `solve_for` within `bounds` is found by root-finding (see
+    find_roots). The grid is then refined cell by cell: wherever the
+    boundary moves by more than `tolerance` (default: 1% of the `bounds`
+    range) or the number of crossings changes between two neighbouring
+    corners of a grid cell, the cell is halved along that axis, up to
+    `max_refinements` times. Only the new corner lines are solved, so the
+    simulations concentrate next to the boundary's bends instead of filling
+    whole grid rows and columns.
+
+    Any parameter of simulate_investment_strategies_batch with a continuous
+    value can be an axis or `solve_for`, as can 'ter_difference' (the Säule 3a
+    TER minus `wealth_ter`). Remaining keyword arguments are passed on to the
+    simulation.
+
+    Returns a DataFrame contour dataset with one row per crossing: the axis
+    values, the break-even `solve_for` value, 'Branch' numbering several
+    crossings on one line from low to high and 'Direction' (+1 when Säule 3a
+    wins above the break-even value, -1 below). The number of simulated
+    scenarios is in `attrs['evaluations']`.
+    """
+    if not 1 <= len(axes) <= 2:
+        raise ValueError(f"Expected one or two grid axes, got {len(axes)}")
+    if solve_for in axes:
+        raise ValueError(f"'{solve_for}' cannot be both a grid axis and the solved parameter")
+    function = _AdvantageFunction(params)
+    names = list(axes)
+    coordinates = [np.linspace(low, high, resolution) for low, high in axes.values()]
+    if tolerance is None:
+        tolerance = 0.01 * (bounds[1] - bounds[0])
+
+    def boundary_changes(point, neighbour):
+        """Whether the crossings of two neighbouring lines differ in number or by more than tolerance."""
+        roots, neighbour_roots = solved[point][0], solved[neighbour][0]
+        return len(roots) != len(neighbour_roots) or np.any(np.abs(roots - neighbour_roots) > tolerance)
+
+    # Crossings of every solved line, keyed by its axis values. A cell is a (low, high) range per axis
+    # with a solved line at every corner; only the cells refined in the last pass are checked again.
+    solved = {}
+    lines = set(itertools.product(*coordinates))
+    cells = list(itertools.product(*(list(zip(values[:-1], values[1:])) for values in coordinates)))
+    for refinement in range(max_refinements + 1):
+        new_lines = sorted(lines - solved.keys())
+        if new_lines:
+            points = np.array(new_lines)
+            line, roots, directions = find_roots(
+                function, {name: points[:, position] for position, name in enumerate(names)},
+                solve_for, bounds, scan_points=scan_points, xtol=xtol, max_iterations=max_iterations)
+            for position, point in enumerate(new_lines):
+                found = line == position
+                solved[point] = (roots[found], directions[found])
+        if refinement == max_refinements:
+            break
+
+        # Halve a cell along every axis on which the boundary changes between two of its corners
+        refined = []
+        for cell in cells:
+            halves = []
+            for position, (low, high) in enumerate(cell):
+                split = any(boundary_changes(corner, corner[:position] + (high,) + corner[position + 1:])
+                            for corner in itertools.product(*cell) if corner[position] == low)
+                middle = (low + high) / 2
+                halves.append([(low, middle), (middle, high)] if split else [(low, high)])
+            if any(len(ranges) == 2 for ranges in halves):
+                refined.extend(itertools.product(*halves))
+        if not refined:
+            break
+        cells = refined
+        lines = {corner for cell in cells for corner in itertools.product(*cell)}
+
+    rows = []
+    for point in sorted(solved):
+        roots, directions = solved[point]
+        for branch, (root, direction) in enumerate(zip(roots, directions)):
+            rows.append({**dict(zip(names, point)), solve_for: root, 'Branch': branch, 'Direction': int(direction)})
+    contour = pd.DataFrame(rows, columns=names + [solve_for, 'Branch', 'Direction'])
+    contour.attrs['evaluations'] = function.evaluations
+    return contour
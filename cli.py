@@ -0,0 +1,315 @@
+"""Command-line interface: tax, simulate, sweep, montecarlo and backtest runs with JSON/CSV/Parquet output."""
+import argparse
+import csv
+import inspect
+import io
+import itertools
+import json
+import sys
+
+from investements_vs_saeule_3_a import (
+    calculate_income_tax,
+    calculate_joint_income_tax,
+    calculate_joint_total_tax,
+    calculate_saeule_3a_withdrawal_tax,
+    calculate_total_tax,
+    calculate_wealth_tax,
+    histories_to_dataframe,
+    simulate_investment_strategies,
+    summarize_simulation,
+)
+
+FORMATS = ('json', 'csv', 'parquet')
+INTEGER_PARAMETERS = ('years', 'num_3a_accounts', 'contribution_seed')
+
+# Keyword arguments of simulate_investment_strategies that can be set from the command line
+SIMULATION_PARAMETERS = [name for name in inspect.signature(simulate_investment_strategies).parameters
+                         if name != 'columnar']
+
+def _json_default(value):
+    """Convert NumPy scalars (and anything else with .item()) for json.dumps."""
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def write_records(records, output_format='json', output='-'):
+    """Write an iterable of dicts to a file or stdout ('-').
+
+    'json' writes one JSON object per line and 'csv' one row per record, both
+    as the records arrive. 'parquet' collects all records into a DataFrame
+    first and needs pyarrow or fastparquet.
+    """
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {FORMATS}")
+
+    if output_format == 'parquet':
+        import pandas as pd
+
+        buffer = io.BytesIO()
+        pd.DataFrame(list(records)).to_parquet(buffer, index=False)
+        if output == '-':
+            sys.stdout.buffer.write(buffer.getvalue())
+            sys.stdout.buffer.flush()
+        else:
+            with open(output, 'wb') as stream:
+                stream.write(buffer.getvalue())
+        return
+
+    stream = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8', newline='')
+    try:
+        writer = None
+        for record in records:
+            if output_format == 'json':
+                stream.write(json.dumps(record, default=_json_default) + '\n')
+            else:
+                if writer is None:
+                    writer = csv.DictWriter(stream, fieldnames=list(record))
+                    writer.writeheader()
+                writer.writerow(record)
+            stream.flush()
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+def load_config(path):
+    """Load a JSON (or .toml) config file of option values keyed by their underscore names."""
+    if path.endswith('.toml'):
+        import tomllib
+
+        with open(path, 'rb') as stream:
+            return tomllib.load(stream)
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+def _parse_value(text):
+    """Parse a grid value from the command line as int, float or string."""
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def _parse_grid_entry(text):
+    """Parse 'name=v1,v2,...' into (name, [values])."""
+    name, separator, values = text.partition('=')
+    if not separator or not values:
+        raise argparse.ArgumentTypeError(f"Expected name=value1,value2,... but got '{text}'")
+    return name.strip(), [_parse_value(value.strip()) for value in values.split(',')]
+
+def _add_simulation_arguments(parser):
+    group = parser.add_argument_group('simulation parameters')
+    for name in SIMULATION_PARAMETERS:
+        group.add_argument('--' + name.replace('_', '-'), dest=name, default=argparse.SUPPRESS,
+                           type=int if name in INTEGER_PARAMETERS else float)
+
+def _add_cache_argument(parser):
+    parser.add_argument('--cache-dir', default=argparse.SUPPRESS, metavar='DIR',
+                        help="Reuse and store simulation results in this on-disk cache")
+
+def _add_output_arguments(parser):
+    group = parser.add_argument_group('output')
+    group.add_argument('--format', dest='output_format', choices=FORMATS, default=argparse.SUPPRESS,
+                       help="Output format (default: json, one object per line)")
+    group.add_argument('-o', '--output', default=argparse.SUPPRESS, help="Output file (default: stdout)")
+    group.add_argument('--config', default=argparse.SUPPRESS,
+                       help="JSON or TOML file with option values; command-line flags take precedence")
+
+def _frame_records(frame):
+    """DataFrame rows as dicts, with missing values as None (empty in CSV, null in JSON)."""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+def _simulation_params(options):
+    return {name: options[name] for name in SIMULATION_PARAMETERS if name in options}
+
+def run_tax(options):
+    """Tax for every income/wealth combination, or the withdrawal tax for each withdrawal amount.
+
+    With --joint incomes are a married couple's joint income, and the
+    withdrawals are one household's withdrawals of the same tax year, taxed
+    together at the rate of their sum.
+    """
+    joint = options.get('joint', False)
+    if 'withdrawal' in options:
+        year_total = sum(options['withdrawal']) if joint else None
+        for amount in options['withdrawal']:
+            yield {'Withdrawal': amount, 'Withdrawal_Tax': calculate_saeule_3a_withdrawal_tax(amount, year_total)}
+        return
+    for income, wealth in itertools.product(options.get('income', [100000]), options.get('wealth', [0])):
+        yield {
+            'Income': income,
+            'Wealth': wealth,
+            'Income_Tax': calculate_joint_income_tax(income) if joint else calculate_income_tax(income),
+            'Wealth_Tax': calculate_wealth_tax(wealth),
+            'Total_Tax': calculate_joint_total_tax(income, wealth) if joint else calculate_total_tax(income, wealth),
+        }
+
+def run_simulate(options):
+    """Summary metrics of one simulation, or its full per-year histories with --history."""
+    params = _simulation_params(options)
+    if options.get('cache_dir'):
+        from result_cache import ResultCache
+
+        results = ResultCache(options['cache_dir']).simulate(**params)
+    else:
+        results = simulate_investment_strategies(**params)
+    if options.get('history'):
+        yield from _frame_records(histories_to_dataframe(*results[:6]))
+    else:
+        yield {**params, **summarize_simulation(*results)}
+
+def run_sweep(options):
+    """Summary metrics for every combination of the parameter grid."""
+    from sweep import run_parameter_sweep
+
+    grid = dict(options.get('grid', {}))
+    # Fixed simulation parameters are a grid axis with a single value
+    for name, value in _simulation_params(options).items():
+        grid.setdefault(name, [value])
+    if not grid:
+        raise ValueError("A sweep needs a grid (--grid name=v1,v2,... or 'grid' in the config file)")
+    results = run_parameter_sweep(grid, max_workers=options.get('max_workers'),
+                                  chunk_size=options.get('chunk_size'),
+                                  progress=_stderr_progress if options.get('progress') else None,
+                                  cache_dir=options.get('cache_dir'))
+    yield from _frame_records(results)
+
+def _stderr_progress(completed, total):
+    print(f"\rSweep progress: {completed:,}/{total:,} combinations ({completed / total:.0%})",
+          end='\n' if completed == total else '', file=sys.stderr, flush=True)
+
+def run_montecarlo(options):
+    """Percentile bands of final wealth per strategy."""
+    from monte_carlo import simulate_monte_carlo
+
+    kwargs = _simulation_params(options)
+    for name in ('n_paths', 'distribution', 'volatility', 'saeule_3a_volatility', 'correlation',
+                 'chunk_size', 'seed', 'percentiles'):
+        if name in options:
+            kwargs[name] = options[name]
+    if 'historical_returns' in options:
+        returns = options['historical_returns']
+        kwargs['historical_returns'] = _read_returns(returns) if isinstance(returns, str) else returns
+    bands = simulate_monte_carlo(**kwargs)
+    yield from _frame_records(bands.reset_index())
+
+def run_backtest(options):
+    """Distribution of final wealth per strategy across historical start years, or every window with --by-window."""
+    from backtest import backtest_strategies, load_market_returns, summarize_backtest
+
+    if 'returns' not in options:
+        raise ValueError("A backtest needs a return series (--returns FILE)")
+    kwargs = {name: value for name, value in _simulation_params(options).items()
+              if name not in ('wealth_growth_rate', 'saeule_3a_growth_rate')}
+    for name in ('wealth_equity_share', 'saeule_3a_equity_share', 'terms'):
+        if name in options:
+            kwargs[name] = options[name]
+    outcomes = backtest_strategies(load_market_returns(options['returns']), **kwargs)
+    if options.get('by_window'):
+        yield from _frame_records(outcomes)
+    else:
+        summary = summarize_backtest(outcomes, options.get('percentiles', (5, 25, 50, 75, 95)))
+        yield from _frame_records(summary.reset_index())
+
+def _read_returns(path):
+    """Read a return series from a file with one number per line (a header line is skipped)."""
+    returns = []
+    with open(path, encoding='utf-8') as stream:
+        for line in stream:
+            value = line.strip().split(',')[-1]
+            if value:
+                try:
+                    returns.append(float(value))
+                except ValueError:
+                    if returns:
+                        raise
+    return returns
+
+COMMANDS = {
+    'tax': run_tax,
+    'simulate': run_simulate,
+    'sweep': run_sweep,
+    'montecarlo': run_montecarlo,
+    'backtest': run_backtest,
+}
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='cli.py', description="Säule 3a vs direct investment simulations with machine-readable output.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    tax = subparsers.add_parser('tax', help="Income, wealth and Säule 3a withdrawal taxes")
+    tax.add_argument('--income', type=float, nargs='+', default=argparse.SUPPRESS)
+    tax.add_argument('--wealth', type=float, nargs='+', default=argparse.SUPPRESS)
+    tax.add_argument('--withdrawal', type=float, nargs='+', default=argparse.SUPPRESS,
+                     help="Säule 3a withdrawal amounts (instead of income/wealth)")
+    tax.add_argument('--joint', action='store_true', default=argparse.SUPPRESS,
+                     help="Married couple: joint tariff, and withdrawals taxed together as one tax year")
+    _add_output_arguments(tax)
+
+    simulate = subparsers.add_parser('simulate', help="Run one simulation")
+    simulate.add_argument('--history', action='store_true', default=argparse.SUPPRESS,
+                          help="Output the per-year history of every strategy instead of the summary")
+    _add_cache_argument(simulate)
+    _add_simulation_arguments(simulate)
+    _add_output_arguments(simulate)
+
+    sweep = subparsers.add_parser('sweep', help="Run a parameter grid on a process pool")
+    sweep.add_argument('--grid', type=_parse_grid_entry, action='append', default=argparse.SUPPRESS,
+                       metavar='NAME=V1,V2,...', help="Grid axis; repeat for more parameters")
+    sweep.add_argument('--max-workers', type=int, default=argparse.SUPPRESS)
+    sweep.add_argument('--chunk-size', type=int, default=argparse.SUPPRESS)
+    sweep.add_argument('--progress', action='store_true', default=argparse.SUPPRESS,
+                       help="Report progress on stderr")
+    _add_cache_argument(sweep)
+    _add_simulation_arguments(sweep)
+    _add_output_arguments(sweep)
+
+    montecarlo = subparsers.add_parser('montecarlo', help="Monte Carlo percentile bands of final wealth")
+    montecarlo.add_argument('--n-paths', type=int, default=argparse.SUPPRESS)
+    montecarlo.add_argument('--distribution', choices=('normal', 'lognormal', 'bootstrap'),
+                            default=argparse.SUPPRESS)
+    montecarlo.add_argument('--volatility', type=float, default=argparse.SUPPRESS)
+    montecarlo.add_argument('--saeule-3a-volatility', type=float, default=argparse.SUPPRESS)
+    montecarlo.add_argument('--correlation', type=float, default=argparse.SUPPRESS)
+    montecarlo.add_argument('--historical-returns', default=argparse.SUPPRESS, metavar='FILE',
+                            help="Return series to bootstrap from, one value per line")
+    montecarlo.add_argument('--percentiles', type=float, nargs='+', default=argparse.SUPPRESS)
+    montecarlo.add_argument('--chunk-size', type=int, default=argparse.SUPPRESS)
+    montecarlo.add_argument('--seed', type=int, default=argparse.SUPPRESS)
+    _add_simulation_arguments(montecarlo)
+    _add_output_arguments(montecarlo)
+
+    backtest = subparsers.add_parser('backtest', help="Run every strategy over rolling historical windows")
+    backtest.add_argument('--returns', default=argparse.SUPPRESS, metavar='FILE',
+                          help="CSV with year, equities and bonds returns (and optionally inflation)")
+    backtest.add_argument('--wealth-equity-share', type=float, default=argparse.SUPPRESS)
+    backtest.add_argument('--saeule-3a-equity-share', type=float, default=argparse.SUPPRESS)
+    backtest.add_argument('--terms', choices=('nominal', 'real'), default=argparse.SUPPRESS)
+    backtest.add_argument('--percentiles', type=float, nargs='+', default=argparse.SUPPRESS)
+    backtest.add_argument('--by-window', action='store_true', default=argparse.SUPPRESS,
+                          help="Output the outcome of every start year instead of the summary")
+    _add_simulation_arguments(backtest)
+    _add_output_arguments(backtest)
+
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args = vars(parser.parse_args(argv))
+    command = args.pop('command')
+
+    options = load_config(args['config']) if 'config' in args else {}
+    if 'grid' in args:
+        options['grid'] = {**options.get('grid', {}), **dict(args.pop('grid'))}
+    options.update(args)
+
+    try:
+        write_records(COMMANDS[command](options), options.get('output_format', 'json'), options.get('output', '-'))
+    except ImportError as error:
+        parser.exit(2, f"{parser.prog}: error: {error}\n")
+    except (ValueError, TypeError, OSError) as error:
+        parser.exit(1, f"{parser.prog}: error: {error}\n")
+
+if __name__ == "__main__":
+    main()
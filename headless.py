@@ -0,0 +1,39 @@
+"""Headless batch runs: simulate parameter sets and emit numeric results only, without plotting."""
+import json
+import sys
+
+from investements_vs_saeule_3_a import simulate_investment_strategies, summarize_simulation
+
+def run_batch(parameter_sets, cache=None):
+    """Simulate each parameter set and yield its parameters plus summary metrics.
+
+    With a result_cache.ResultCache as `cache`, stored results are reused and
+    new ones are added to it.
+    """
+    simulate = simulate_investment_strategies if cache is None else cache.simulate
+    for params in parameter_sets:
+        results = simulate(**params)
+        yield {**params, **summarize_simulation(*results)}
+
+def read_parameter_sets(stream):
+    """Read parameter sets from a stream of JSON objects, one per line (blank lines are skipped)."""
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+def main(argv=None):
+    """Read parameter sets from the given JSON-lines files (or stdin) and write one JSON result per line."""
+    paths = sys.argv[1:] if argv is None else argv
+    streams = [open(path, encoding='utf-8') for path in paths] if paths else [sys.stdin]
+    try:
+        for stream in streams:
+            for row in run_batch(read_parameter_sets(stream)):
+                sys.stdout.write(json.dumps(row) + '\n')
+    finally:
+        for stream in streams:
+            if stream is not sys.stdin:
+                stream.close()
+
+if __name__ == "__main__":
+    main()
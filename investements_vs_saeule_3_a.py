@@ -1,29 +1,69 @@
-import matplotlib.pyplot as plt
+import contextlib
+import functools
+import numpy as np
 import random
+import time
+
+# Wealth tax brackets in CHF and their rates in permille (‰)
+WEALTH_TAX_FREIBETRAG = 100000
+WEALTH_TAX_BRACKETS = [
+    (35000, 0),
+    (40000, 0.4),
+    (135000, 0.7),
+    (215000, 0.8),
+    (360000, 1.0),
+    (535000, 1.2),
+    (2300000, 1.3),
+    (2500000, 1.35)
+]
+WEALTH_TAX_TOP_RATE = 1.25
+
+# Income tax brackets (upper limits) in CHF and their rates in percent
+INCOME_TAX_BRACKETS = [
+    (17800, 0),
+    (35600, 0.44),
+    (58400, 0.88),
+    (89200, 1.32),
+    (116900, 1.76),
+    (176800, 2.20),
+    (351600, 2.64)
+]
+INCOME_TAX_TOP_RATE = 2.97
+
+# Säule 3a withdrawal tax: (upper threshold, flat rate on the whole amount)
+SAEULE_3A_WITHDRAWAL_TAX_BRACKETS = [
+    (50000, 0.047),
+    (100000, 0.056),
+    (150000, 0.066),
+    (200000, 0.075),
+    (250000, 0.084),
+    (300000, 0.093),
+    (350000, 0.102),
+    (400000, 0.111),
+    (450000, 0.120),
+    (500000, 0.129)
+]
+
+# Married couples: joint income is taxed at the single tariff's rate for income / divisor
+# (splitting), joint wealth with the single wealth tax schedule
+JOINT_INCOME_SPLITTING_DIVISOR = 1.9
+
+# Tax multipliers
+CANTON_MULTIPLIER = 3.025
+MUNICIPAL_MULTIPLIER = 1.54
+TOTAL_MULTIPLIER = CANTON_MULTIPLIER + MUNICIPAL_MULTIPLIER
 
 def calculate_wealth_tax(wealth):
     """Calculate wealth tax ('Vermögenssteuer') for Canton Bern."""
-    if wealth <= 100000:  # Freibetrag
+    if wealth <= WEALTH_TAX_FREIBETRAG:  # Freibetrag
         return 0
     
-    # Tax brackets in CHF and their rates in permille (‰)
-    brackets = [
-        (35000, 0),
-        (40000, 0.4),
-        (135000, 0.7),
-        (215000, 0.8),
-        (360000, 1.0),
-        (535000, 1.2),
-        (2300000, 1.3),
-        (2500000, 1.35)
-    ]
-    
     tax = 0
     remaining_wealth = wealth
     current_base = 0
     
     # Calculate for each bracket
-    for bracket_size, rate in brackets:
+    for bracket_size, rate in WEALTH_TAX_BRACKETS:
         if remaining_wealth <= 0:
             break
             
@@ -34,29 +74,18 @@ def calculate_wealth_tax(wealth):
     
     # Calculate remaining wealth at highest rate
     if remaining_wealth > 0:
-        tax += remaining_wealth * (1.25 / 1000)  # Final rate of 1.25‰
+        tax += remaining_wealth * (WEALTH_TAX_TOP_RATE / 1000)  # Final rate of 1.25‰
     
     return tax
 
 def calculate_income_tax(income):
     """Calculate income tax ('Einkommenssteuer') for Canton Bern - Single person."""
-    # Tax brackets in CHF and their rates in percent
-    brackets = [
-        (17800, 0),
-        (35600, 0.44),
-        (58400, 0.88),
-        (89200, 1.32),
-        (116900, 1.76),
-        (176800, 2.20),
-        (351600, 2.64)
-    ]
-    
     tax = 0
     remaining_income = income
     current_base = 0
     
     # Calculate for each bracket
-    for bracket_limit, rate in brackets:
+    for bracket_limit, rate in INCOME_TAX_BRACKETS:
         if remaining_income <= 0:
             break
             
@@ -68,16 +97,22 @@ def calculate_income_tax(income):
     
     # Calculate remaining income at highest rate
     if remaining_income > bracket_limit:
-        tax += (remaining_income - bracket_limit) * (2.97 / 100)
+        tax += (remaining_income - bracket_limit) * (INCOME_TAX_TOP_RATE / 100)
     
     return tax
 
+def calculate_joint_income_tax(income):
+    """Calculate income tax on a married couple's joint income (single tariff with splitting)."""
+    return calculate_income_tax(income / JOINT_INCOME_SPLITTING_DIVISOR) * JOINT_INCOME_SPLITTING_DIVISOR
+
+def calculate_joint_total_tax(income, wealth):
+    """Calculate a married couple's total tax on joint income and wealth including multipliers."""
+    return (calculate_joint_income_tax(income) + calculate_wealth_tax(wealth)) * TOTAL_MULTIPLIER
+
 def calculate_total_tax(income, wealth):
     """Calculate total tax including cantonal and municipal multipliers."""
-    # Tax multipliers
-    CANTON_MULTIPLIER = 3.025
-    MUNICIPAL_MULTIPLIER = 1.54
-    TOTAL_MULTIPLIER = CANTON_MULTIPLIER + MUNICIPAL_MULTIPLIER
+    if _active_tax_cache is not None:
+        return _active_tax_cache.total_tax(income, wealth)
     
     # Calculate base taxes
     income_tax = calculate_income_tax(income)
@@ -88,6 +123,146 @@ def calculate_total_tax(income, wealth):
     
     return total_tax
 
+class TaxCache:
+    """Bounded LRU cache for income and wealth tax with quantized keys.
+
+    Income tax and wealth tax are cached separately, so one income tax result
+    is reused for every wealth it is combined with. Keys are rounded to
+    `income_quantum` / `wealth_quantum` CHF (None keeps exact keys), trading a
+    small rounding error for a higher hit rate on clustered values.
+    """
+    
+    def __init__(self, maxsize=100000, wealth_quantum=1, income_quantum=None):
+        self.maxsize = maxsize
+        self.wealth_quantum = wealth_quantum
+        self.income_quantum = income_quantum
+        self._income_tax = functools.lru_cache(maxsize=maxsize)(calculate_income_tax)
+        self._wealth_tax = functools.lru_cache(maxsize=maxsize)(calculate_wealth_tax)
+    
+    @staticmethod
+    def _quantize(value, quantum):
+        return value if quantum is None else round(value / quantum) * quantum
+    
+    def income_tax(self, income):
+        return self._income_tax(self._quantize(income, self.income_quantum))
+    
+    def wealth_tax(self, wealth):
+        return self._wealth_tax(self._quantize(wealth, self.wealth_quantum))
+    
+    def total_tax(self, income, wealth):
+        return (self.income_tax(income) + self.wealth_tax(wealth)) * TOTAL_MULTIPLIER
+    
+    def stats(self):
+        """Return hit/miss statistics of both caches."""
+        stats = {}
+        for name, cache in [('income', self._income_tax), ('wealth', self._wealth_tax)]:
+            info = cache.cache_info()
+            lookups = info.hits + info.misses
+            stats[f'{name}_hits'] = info.hits
+            stats[f'{name}_misses'] = info.misses
+            stats[f'{name}_size'] = info.currsize
+            stats[f'{name}_hit_rate'] = info.hits / lookups if lookups else 0.0
+        return stats
+    
+    def clear(self):
+        self._income_tax.cache_clear()
+        self._wealth_tax.cache_clear()
+
+# Cache used by calculate_total_tax while enabled (None: compute every call)
+_active_tax_cache = None
+
+def enable_tax_cache(maxsize=100000, wealth_quantum=1, income_quantum=None):
+    """Route calculate_total_tax through a new TaxCache and return it."""
+    global _active_tax_cache
+    _active_tax_cache = TaxCache(maxsize, wealth_quantum, income_quantum)
+    return _active_tax_cache
+
+def active_tax_cache():
+    """Return the TaxCache calculate_total_tax currently uses, or None."""
+    return _active_tax_cache
+
+def disable_tax_cache():
+    """Stop caching in calculate_total_tax."""
+    global _active_tax_cache
+    _active_tax_cache = None
+
+@contextlib.contextmanager
+def cached_taxes(maxsize=100000, wealth_quantum=1, income_quantum=None):
+    """Context manager enabling the tax cache for a block and yielding it (for stats)."""
+    global _active_tax_cache
+    previous = _active_tax_cache
+    cache = enable_tax_cache(maxsize, wealth_quantum, income_quantum)
+    try:
+        yield cache
+    finally:
+        _active_tax_cache = previous
+
+def _compile_brackets(upper_limits, rates, top_rate, rate_unit):
+    """Compile progressive brackets into lower bounds, rates and cumulative tax arrays.
+
+    The cumulative tax is summed bracket by bracket in the same order as the
+    scalar loops, so the vectorized results match the scalar ones exactly.
+    """
+    lower_bounds = [0] + list(upper_limits)
+    decimal_rates = [rate / rate_unit for rate in rates] + [top_rate / rate_unit]
+    
+    cumulative_tax = [0.0]
+    tax = 0
+    current_base = 0
+    for bracket_limit, rate in zip(upper_limits, decimal_rates):
+        tax += (bracket_limit - current_base) * rate
+        cumulative_tax.append(tax)
+        current_base = bracket_limit
+    
+    return (np.array(upper_limits, dtype=float),
+            np.array(lower_bounds, dtype=float),
+            np.array(decimal_rates, dtype=float),
+            np.array(cumulative_tax, dtype=float))
+
+def _evaluate_brackets(values, table):
+    """Evaluate a compiled bracket table for an array of taxable amounts."""
+    upper_limits, lower_bounds, rates, cumulative_tax = table
+    bracket = np.searchsorted(upper_limits, values, side='left')
+    return cumulative_tax[bracket] + (values - lower_bounds[bracket]) * rates[bracket]
+
+# Bracket tables compiled once at import time for the vectorized tax functions
+_INCOME_TAX_TABLE = _compile_brackets(
+    [limit for limit, _ in INCOME_TAX_BRACKETS],
+    [rate for _, rate in INCOME_TAX_BRACKETS],
+    INCOME_TAX_TOP_RATE, 100)
+_WEALTH_TAX_TABLE = _compile_brackets(
+    np.cumsum([size for size, _ in WEALTH_TAX_BRACKETS]).tolist(),
+    [rate for _, rate in WEALTH_TAX_BRACKETS],
+    WEALTH_TAX_TOP_RATE, 1000)
+_WITHDRAWAL_TAX_THRESHOLDS = np.array([threshold for threshold, _ in SAEULE_3A_WITHDRAWAL_TAX_BRACKETS], dtype=float)
+_WITHDRAWAL_TAX_RATES = np.array([rate for _, rate in SAEULE_3A_WITHDRAWAL_TAX_BRACKETS], dtype=float)
+
+def calculate_income_tax_vectorized(incomes):
+    """Calculate income tax for an array of incomes (matches calculate_income_tax)."""
+    incomes = np.asarray(incomes, dtype=float)
+    tax = _evaluate_brackets(incomes, _INCOME_TAX_TABLE)
+    return np.where(incomes > 0, tax, 0.0)
+
+def calculate_wealth_tax_vectorized(wealths):
+    """Calculate wealth tax for an array of wealths (matches calculate_wealth_tax)."""
+    wealths = np.asarray(wealths, dtype=float)
+    tax = _evaluate_brackets(wealths, _WEALTH_TAX_TABLE)
+    return np.where(wealths > WEALTH_TAX_FREIBETRAG, tax, 0.0)
+
+def calculate_total_tax_vectorized(incomes, wealths):
+    """Calculate total tax for arrays of incomes and wealths (broadcast against each other)."""
+    income_tax = calculate_income_tax_vectorized(incomes)
+    wealth_tax = calculate_wealth_tax_vectorized(wealths)
+    return (income_tax + wealth_tax) * TOTAL_MULTIPLIER
+
+def calculate_joint_total_tax_vectorized(incomes, wealths):
+    """Calculate married couples' total tax for arrays of joint incomes and wealths."""
+    incomes = np.asarray(incomes, dtype=float)
+    divisor = JOINT_INCOME_SPLITTING_DIVISOR
+    income_tax = calculate_income_tax_vectorized(incomes / divisor) * divisor
+    wealth_tax = calculate_wealth_tax_vectorized(wealths)
+    return (income_tax + wealth_tax) * TOTAL_MULTIPLIER
+
 # Example usage and testing
 def print_tax_analysis(income, wealth):
     """Print detailed tax analysis for given income and wealth."""
@@ -116,8 +291,267 @@ if __name__ == "__main__":
     for income, wealth in test_cases:
         print_tax_analysis(income, wealth)
 
+class YearIndexedHistory(list):
+    """List of per-year records (dicts with a 'Year' key) with O(1) lookup by year.
+
+    Behaves like the plain lists of dicts used so far, but keeps an index from
+    year to the first record of that year, so lookups no longer scan the list.
+    Appending keeps the index up to date; any other change to the list drops
+    it, and it is rebuilt on the next lookup.
+    """
+    
+    def __init__(self, records=()):
+        super().__init__()
+        self._by_year = {}
+        self.extend(records)
+    
+    def __reduce__(self):
+        # Rebuild through __init__ so the index exists before the records are added
+        return (YearIndexedHistory, (list(self),))
+    
+    def _index(self):
+        """Return the year index, rebuilding it after a change other than append."""
+        if self._by_year is None:
+            self._by_year = {}
+            for record in self:
+                self._by_year.setdefault(record['Year'], record)
+        return self._by_year
+    
+    def _changed(self):
+        self._by_year = None
+    
+    def append(self, record):
+        super().append(record)
+        if self._by_year is not None:
+            self._by_year.setdefault(record['Year'], record)
+    
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+    
+    def __iadd__(self, records):
+        self.extend(records)
+        return self
+    
+    def __imul__(self, count):
+        self._changed()
+        return super().__imul__(count)
+    
+    def __setitem__(self, index, value):
+        self._changed()
+        super().__setitem__(index, value)
+    
+    def __delitem__(self, index):
+        self._changed()
+        super().__delitem__(index)
+    
+    def insert(self, index, record):
+        self._changed()
+        super().insert(index, record)
+    
+    def pop(self, index=-1):
+        self._changed()
+        return super().pop(index)
+    
+    def remove(self, record):
+        self._changed()
+        super().remove(record)
+    
+    def clear(self):
+        self._changed()
+        super().clear()
+    
+    def sort(self, *args, **kwargs):
+        self._changed()
+        super().sort(*args, **kwargs)
+    
+    def reverse(self):
+        self._changed()
+        super().reverse()
+    
+    def copy(self):
+        """Return a copy sharing the (never modified) records."""
+        history = YearIndexedHistory()
+        list.extend(history, self)
+        history._by_year = None if self._by_year is None else self._by_year.copy()
+        return history
+    
+    def for_year(self, year, default=None):
+        """Return the record for the given year, or default if there is none."""
+        return self._index().get(year, default)
+    
+    def value_for_year(self, year, key, default=0):
+        """Return one field of the record for the given year, or default if there is none."""
+        record = self._index().get(year)
+        return record[key] if record is not None else default
+
+class ColumnarHistory:
+    """Per-year history stored as preallocated NumPy columns instead of a list of dicts.
+
+    Every numeric field (Wealth, Saeule_3a, Yearly_Tax, Cumulative_Tax,
+    Withdrawal, ...) is kept in its own array and the per-account balances in
+    a 2-D (years, accounts) matrix, so no dict or list copy is kept per year.
+    Records are appended and read back as dicts like YearIndexedHistory, so
+    the reporting functions accept either form.
+    """
+    
+    INT_FIELDS = ('Year', 'Active_Accounts')
+    
+    def __init__(self, years, account_columns=0):
+        self._capacity = max(years, 1)
+        self._size = 0
+        self._fields = []
+        self._columns = {}
+        self._account_balances = None
+        self._account_counts = None
+        self._account_columns = account_columns
+        self._by_year = {}
+    
+    def _grow(self, capacity):
+        """Enlarge all columns to hold `capacity` years."""
+        for key, column in self._columns.items():
+            self._columns[key] = np.resize(column, capacity)
+        if self._account_balances is not None:
+            balances = np.zeros((capacity, self._account_balances.shape[1]))
+            balances[:self._size] = self._account_balances[:self._size]
+            self._account_balances = balances
+            self._account_counts = np.resize(self._account_counts, capacity)
+        self._capacity = capacity
+    
+    def _store_accounts(self, row, balances):
+        """Store one year's account balances, widening the matrix if needed."""
+        if self._account_balances is None:
+            self._account_columns = max(self._account_columns, len(balances))
+            self._account_balances = np.zeros((self._capacity, self._account_columns))
+            self._account_counts = np.zeros(self._capacity, dtype=int)
+        elif len(balances) > self._account_balances.shape[1]:
+            # Accounts opened on the fly (Emily): widen geometrically
+            extra = max(len(balances), 2 * self._account_balances.shape[1]) - self._account_balances.shape[1]
+            self._account_balances = np.pad(self._account_balances, ((0, 0), (0, extra)))
+        self._account_balances[row, :len(balances)] = balances
+        self._account_counts[row] = len(balances)
+    
+    def append(self, record):
+        if self._size == self._capacity:
+            self._grow(2 * self._capacity)
+        row = self._size
+        for key, value in record.items():
+            if key not in self._fields:
+                self._fields.append(key)
+            if key == 'Saeule_3a_Accounts':
+                self._store_accounts(row, value)
+                continue
+            if key not in self._columns:
+                self._columns[key] = np.zeros(self._capacity, dtype=int if key in self.INT_FIELDS else float)
+            self._columns[key][row] = value
+        self._by_year.setdefault(record['Year'], row)
+        self._size += 1
+    
+    def _record(self, row):
+        """Rebuild the dict for one stored year."""
+        record = {}
+        for key in self._fields:
+            if key == 'Saeule_3a_Accounts':
+                record[key] = self._account_balances[row, :self._account_counts[row]].tolist()
+            else:
+                record[key] = self._columns[key][row].item()
+        return record
+    
+    def copy(self):
+        """Return an independent copy of the history."""
+        history = ColumnarHistory(self._capacity, self._account_columns)
+        history._size = self._size
+        history._fields = list(self._fields)
+        history._columns = {key: column.copy() for key, column in self._columns.items()}
+        if self._account_balances is not None:
+            history._account_balances = self._account_balances.copy()
+            history._account_counts = self._account_counts.copy()
+        history._by_year = self._by_year.copy()
+        return history
+    
+    def __len__(self):
+        return self._size
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._record(row) for row in range(self._size)[index]]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError('history index out of range')
+        return self._record(index)
+    
+    def __iter__(self):
+        for row in range(self._size):
+            yield self._record(row)
+    
+    def for_year(self, year, default=None):
+        """Return the record for the given year, or default if there is none."""
+        row = self._by_year.get(year)
+        return self._record(row) if row is not None else default
+    
+    def value_for_year(self, year, key, default=0):
+        """Return one field of the record for the given year, or default if there is none."""
+        row = self._by_year.get(year)
+        return self._columns[key][row].item() if row is not None else default
+    
+    def column(self, key):
+        """Return the NumPy array of one field over all stored years."""
+        return self._columns[key][:self._size]
+    
+    @property
+    def account_balances(self):
+        """2-D (years, accounts) matrix of Säule 3a account balances, or None."""
+        if self._account_balances is None:
+            return None
+        return self._account_balances[:self._size]
+    
+    @property
+    def nbytes(self):
+        """Memory used by the stored arrays."""
+        arrays = list(self._columns.values())
+        if self._account_balances is not None:
+            arrays += [self._account_balances, self._account_counts]
+        return sum(array.nbytes for array in arrays)
+    
+    def to_dataframe(self):
+        """Return the history as a DataFrame with one row per year."""
+        import pandas as pd
+
+        data = {key: self.column(key) for key in self._fields if key != 'Saeule_3a_Accounts'}
+        if self._account_balances is not None:
+            for account in range(self._account_balances.shape[1]):
+                data[f'Saeule_3a_Account_{account + 1}'] = self._account_balances[:self._size, account]
+        return pd.DataFrame(data)
+
+def as_year_indexed(records):
+    """Return records with year lookups, indexing plain lists once."""
+    if isinstance(records, (YearIndexedHistory, ColumnarHistory)):
+        return records
+    return YearIndexedHistory(records)
+
+def histories_to_dataframe(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history):
+    """Combine the histories of all persons into one long DataFrame with a 'Strategy' column."""
+    import pandas as pd
+
+    frames = []
+    for name, history in [('Alice', p1_history), ('Bob', p2_history), ('Charly', p3_history),
+                          ('Dominic', p4_history), ('Emily', p5_history), ('Alice_adjusted', p6_history)]:
+        if isinstance(history, ColumnarHistory):
+            frame = history.to_dataframe()
+        else:
+            frame = pd.DataFrame([{key: value for key, value in entry.items() if key != 'Saeule_3a_Accounts'}
+                                  for entry in history])
+        frame.insert(0, 'Strategy', name)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
 def calculate_3a_contribution(base_contribution, year):
-    """Calculate 3a contribution limit for a given year with 2% ± 0.5% biennial increase."""
+    """Calculate 3a contribution limit for a given year with 2% ± 0.5% biennial increase.
+
+    Draws fresh variations from the global `random` module on every call; use
+    contribution_limit_paths for whole, reproducible limit trajectories.
+    """
     if year <= 1:
         return base_contribution
         
@@ -136,26 +570,206 @@ def calculate_3a_contribution(base_contribution, year):
     new_contribution = min(base_contribution * total_increase, 20000)
     return new_contribution
 
-def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
-                                yearly_investment=20000, saeule_3a_contribution=7258,
-                                wealth_growth_rate=0.04, saeule_3a_growth_rate=0.04, 
-                                wealth_ter=0.001, saeule_3a_ter=0.004, years=42, num_3a_accounts=11):
-    """Simulate and compare four investment strategies over time."""
-    
+def contribution_limit_paths(base_contribution=7258, years=42, seeds=0, cap=20000):
+    """Generate (N, years) 3a contribution limit paths with a 2% ± 0.5% increase every two years.
+
+    Like calculate_3a_contribution, year y is increased by the first (y - 1) // 2
+    variations and capped at `cap`, but all years of a path share the same
+    draws. `seeds` is an int or an (N,) array; every scenario draws from its
+    own numpy Generator seeded with its seed, so a scenario's path does not
+    depend on the other scenarios, on chunking or on the global `random` state.
+    """
+    seeds = np.atleast_1d(np.asarray(seeds, dtype=np.int64))
+    periods = max((years - 1) // 2, 0)
+    # One stream per distinct seed, shared by scenarios with the same seed
+    unique_seeds, scenario_rows = np.unique(seeds, return_inverse=True)
+    draws = np.empty((len(unique_seeds), periods))
+    for row, seed in enumerate(unique_seeds.tolist()):
+        draws[row] = np.random.default_rng(seed).uniform(-0.5, 0.5, periods)
+    variations = 2 + draws[scenario_rows]
+
+    # Cumulative increase after 0, 1, 2, ... periods, multiplied in the same order as the scalar loop
+    total_increase = np.ones((len(seeds), periods + 1))
+    for period in range(periods):
+        total_increase[:, period + 1] = total_increase[:, period] * (1 + variations[:, period] / 100)
+    year_periods = (np.arange(1, years + 1) - 1) // 2
+    return np.minimum(base_contribution * total_increase[:, year_periods], cap)
+
+def grow_shared_3a_accounts(accounts, active_accounts, contribution_per_account,
+                            saeule_3a_growth_rate, saeule_3a_ter):
+    """Apply TER, growth and an equal contribution to a contiguous run of active accounts.
+
+    Accounts that are opened together and always receive the same contribution
+    hold the same balance, so the yearly update is computed once and copied
+    instead of being repeated per account.
+    """
+    if len(active_accounts) > 0:
+        balance = accounts[active_accounts[0]] * (1 - saeule_3a_ter)
+        balance = balance * (1 + saeule_3a_growth_rate)
+        balance += contribution_per_account * (1 - saeule_3a_ter)
+        accounts[active_accounts[0]:active_accounts[-1] + 1] = [balance] * len(active_accounts)
+
+def saeule_3a_growth_factors(saeule_3a_growth_rate=0.04, saeule_3a_ter=0.004, years=42):
+    """Precompute the yearly 3a growth factor (1 - TER) * (1 + growth) raised to the powers 0..years."""
+    return ((1 - saeule_3a_ter) * (1 + saeule_3a_growth_rate)) ** np.arange(years + 1)
+
+def saeule_3a_balance_path(deposits, saeule_3a_growth_rate=0.04, saeule_3a_ter=0.004):
+    """Closed-form end-of-year balances of one 3a account at constant rates.
+
+    `deposits[y - 1]` is the amount paid into the account in year y (before
+    the entry TER). The balance after year y is the geometric series
+    sum_j deposits[j] * (1 - TER) * f^(y - j) with f = (1 - TER) * (1 + growth),
+    evaluated for all years at once from the growth-factor table. Agrees with
+    the year-by-year loop up to floating-point rounding.
+    """
+    deposits = np.asarray(deposits, dtype=float)
+    factors = saeule_3a_growth_factors(saeule_3a_growth_rate, saeule_3a_ter, len(deposits))[1:]
+    return factors * np.cumsum(deposits * (1 - saeule_3a_ter) / factors)
+
+def staggered_withdrawal_balances(num_3a_accounts=11, first_withdrawal_year=32, retirement_year=37,
+                                  saeule_3a_contribution=7258, saeule_3a_growth_rate=0.04,
+                                  saeule_3a_ter=0.004, years=42):
+    """Balance of each account at its withdrawal when one account is closed per year.
+
+    Follows Alice's schedule: the yearly contribution is split equally over the
+    accounts still open until retirement, and one account is withdrawn at the
+    start of every year from `first_withdrawal_year` on. All open accounts hold
+    the same balance, so a single closed-form balance path gives every
+    withdrawal amount. Returns one balance per account closed within `years`.
+    """
+    withdrawal_years = np.arange(first_withdrawal_year, min(first_withdrawal_year + num_3a_accounts, years + 1))
+    if len(withdrawal_years) == 0:
+        return np.zeros(0)
+    # Accounts still open after the withdrawal at the start of each year
+    year_numbers = np.arange(1, withdrawal_years[-1])
+    open_accounts = num_3a_accounts - np.clip(year_numbers - first_withdrawal_year + 1, 0, num_3a_accounts)
+    deposits = np.where((year_numbers < retirement_year) & (open_accounts > 0),
+                        saeule_3a_contribution / np.maximum(open_accounts, 1), 0.0)
+    path = np.concatenate(([0.0], saeule_3a_balance_path(deposits, saeule_3a_growth_rate, saeule_3a_ter)))
+    # An account closed at the start of year y holds the balance after year y - 1
+    return path[withdrawal_years - 1]
+
+class SimulationProfiler:
+    """Cumulative time and call counts per phase of the simulation loop.
+
+    The loop calls lap(phase) at the end of each section, which charges the
+    time since the previous checkpoint to that phase. With `cprofile=True`
+    (see profiled_simulation) a cProfile.Profile also runs for the block and
+    stats() returns its pstats.Stats.
+    """
+    PHASES = ('withdrawals', 'tax', '3a_growth', 'wealth_growth', 'history', 'other')
+
+    def __init__(self):
+        self.cprofile = None
+        self.reset()
+
+    def reset(self):
+        self.times = dict.fromkeys(self.PHASES, 0.0)
+        self.calls = dict.fromkeys(self.PHASES, 0)
+        self._last = time.perf_counter()
+
+    def restart(self):
+        """Start timing from now, discarding the time since the last checkpoint."""
+        self._last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.times[phase] += now - self._last
+        self.calls[phase] += 1
+        self._last = now
+
+    def report(self):
+        """Return {phase: {'time', 'calls', 'share'}} plus the total time under 'total'."""
+        total = sum(self.times.values())
+        report = {phase: {'time': self.times[phase], 'calls': self.calls[phase],
+                          'share': self.times[phase] / total if total else 0.0}
+                  for phase in self.PHASES}
+        report['total'] = {'time': total, 'calls': sum(self.calls.values()), 'share': 1.0 if total else 0.0}
+        return report
+
+    def format_report(self):
+        """Format the report as a text table, slowest phase first."""
+        report = self.report()
+        total = report.pop('total')
+        lines = [f"{'Phase':<20} {'Time (ms)':>10} {'Calls':>8} {'Share':>7}", "-" * 48]
+        for phase, row in sorted(report.items(), key=lambda item: -item[1]['time']):
+            lines.append(f"{phase:<20} {row['time'] * 1000:10.3f} {row['calls']:8d} {row['share']:7.1%}")
+        lines.append("-" * 48)
+        lines.append(f"{'total':<20} {total['time'] * 1000:10.3f} {total['calls']:8d}")
+        return "\n".join(lines)
+
+    def stats(self, sort='cumulative'):
+        """pstats.Stats of the cProfile run (None unless profiled with cprofile=True)."""
+        if self.cprofile is None:
+            return None
+        import pstats
+
+        return pstats.Stats(self.cprofile).sort_stats(sort)
+
+# Profiler the simulation loop reports to while enabled (None: no timing)
+_active_profiler = None
+
+def enable_profiling():
+    """Time the phases of every following simulation with a new SimulationProfiler and return it."""
+    global _active_profiler
+    _active_profiler = SimulationProfiler()
+    return _active_profiler
+
+def disable_profiling():
+    """Stop timing simulation phases."""
+    global _active_profiler
+    _active_profiler = None
+
+@contextlib.contextmanager
+def profiled_simulation(cprofile=False):
+    """Context manager timing simulation phases for a block and yielding the profiler.
+
+    With `cprofile=True` the block also runs under cProfile (available as
+    profiler.stats()); its overhead inflates the phase timings.
+    """
+    global _active_profiler
+    previous = _active_profiler
+    profiler = enable_profiling()
+    if cprofile:
+        import cProfile
+
+        profiler.cprofile = cProfile.Profile()
+        profiler.cprofile.enable()
+    try:
+        yield profiler
+    finally:
+        if cprofile:
+            profiler.cprofile.disable()
+        _active_profiler = previous
+
+def iter_investment_strategies(initial_income=100000, initial_wealth=120000,
+                               yearly_investment=20000, saeule_3a_contribution=7258,
+                               wealth_growth_rate=0.04, saeule_3a_growth_rate=0.04,
+                               wealth_ter=0.001, saeule_3a_ter=0.004, years=42, num_3a_accounts=11,
+                               contribution_seed=None):
+    """Simulate the investment strategies year by year, yielding each year's state as it is computed.
+
+    Every yielded dict has the 'Year', one history record per strategy
+    (keyed 'Alice', 'Bob', ..., 'Alice_adjusted', as in the histories of
+    simulate_investment_strategies) and under 'Withdrawals' the withdrawal
+    record of each strategy for that year, or None. Only the current state
+    is kept, so consumers can stop early or aggregate in constant memory.
+
+    With a `contribution_seed`, Alice_adjusted contributes the rising limit of
+    contribution_limit_paths(saeule_3a_contribution, years, contribution_seed)
+    instead of the fixed contribution.
+    """
     # Person 1: Alice - Uses 10 Säule 3a accounts, starting withdrawal at year 32
     p1_income = initial_income
     p1_wealth = initial_wealth
     p1_saeule_3a_accounts = [0] * num_3a_accounts  # Use the parameter here
     p1_active_accounts = list(range(num_3a_accounts))
     p1_total_taxes = 0
-    p1_history = []
-    withdrawal_history = []
     
     # Person 2: Bob - Only standard investments
     p2_income = initial_income
     p2_wealth = initial_wealth
     p2_total_taxes = 0
-    p2_history = []
     
     # Person 3: Charly - Single Säule 3a account, withdrawal at retirement
     p3_income = initial_income
@@ -163,7 +777,6 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
     p3_saeule_3a_accounts = [0]  # Charly has 1 account
     p3_active_accounts = [0]
     p3_total_taxes = 0
-    p3_history = []
 
     # Person 4: Dominic - 5 Säule 3a accounts, withdrawal starting at retirement
     p4_income = initial_income
@@ -171,12 +784,6 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
     p4_saeule_3a_accounts = [0] * 5  # Dominic has 5 accounts
     p4_active_accounts = list(range(5))
     p4_total_taxes = 0
-    p4_history = []
-
-    # Add withdrawal tracking for Person 2, 3 and 4
-    p2_withdrawals = []
-    p3_withdrawals = []
-    p4_withdrawals = []
 
     # Person 5: Emily - Dynamic 3a accounts based on 50k threshold
     p5_income = initial_income
@@ -184,8 +791,6 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
     p5_saeule_3a_accounts = [0]  # Start with one account
     p5_active_accounts = [0]
     p5_total_taxes = 0
-    p5_history = []
-    p5_withdrawals = []
 
     # Initialize Alice_adjusted similar to Alice
     p6_income = initial_income
@@ -193,10 +798,13 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
     p6_saeule_3a_accounts = [0] * num_3a_accounts
     p6_active_accounts = list(range(num_3a_accounts))
     p6_total_taxes = 0
-    p6_history = []
+    if contribution_seed is not None:
+        p6_contribution_limits = contribution_limit_paths(saeule_3a_contribution, years, contribution_seed)[0].tolist()
 
-    # Set random seed for reproducibility
-    random.seed(42)
+    # Per-phase timing; every check below is a single falsy test while profiling is off
+    profiler = _active_profiler
+    if profiler:
+        profiler.restart()
     
     for year in range(1, years + 1):
         # Determine income and investment amounts based on retirement
@@ -205,6 +813,10 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
         current_3a = saeule_3a_contribution if year < 37 else 0 
         
         yearly_withdrawal_amount = 0  # Track withdrawals for Person 1
+        p1_withdrawal_record = p2_withdrawal_record = p3_withdrawal_record = None
+        p4_withdrawal_record = p5_withdrawal_record = None
+        if profiler:
+            profiler.lap('other')
         
         # Handle Säule 3a account withdrawal and reinvestment for Alice
         if year >= 32 and len(p1_active_accounts) > 0 :
@@ -217,60 +829,76 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
             if year < 37:
                 p1_wealth += after_tax_amount
             
-            withdrawal_history.append({
+            p1_withdrawal_record = {
                 'Year': year,
                 'Account': account_to_close + 1,
                 'Balance': account_balance,
                 'Tax': withdrawal_tax,
                 'After_Tax': after_tax_amount
-            })
+            }
             
             p1_saeule_3a_accounts[account_to_close] = 0
             p1_active_accounts.pop(0)
+
+        # Alice's after-tax withdrawal is what the others match in retirement
+        p1_withdrawal = p1_withdrawal_record['After_Tax'] if p1_withdrawal_record else 0
         
+        if profiler:
+            profiler.lap('withdrawals')
+
         # Calculate and subtract taxes for Alice
         p1_tax = calculate_total_tax(current_income - current_3a, p1_wealth)
         p1_total_taxes += p1_tax
         p1_wealth -= p1_tax  # Subtract taxes from wealth
         
+        if profiler:
+            profiler.lap('tax')
+
         # Handle active 3a accounts
         if len(p1_active_accounts) > 0 and year < 37:
             contribution_per_account = current_3a / len(p1_active_accounts)
         else:
             contribution_per_account = 0
             
-        for acc_idx in p1_active_accounts:
-            p1_saeule_3a_accounts[acc_idx] = p1_saeule_3a_accounts[acc_idx] * (1 - saeule_3a_ter)
-            p1_saeule_3a_accounts[acc_idx] = p1_saeule_3a_accounts[acc_idx] * (1 + saeule_3a_growth_rate)
-            p1_saeule_3a_accounts[acc_idx] += contribution_per_account * (1 - saeule_3a_ter)
+        grow_shared_3a_accounts(p1_saeule_3a_accounts, p1_active_accounts, contribution_per_account,
+                                saeule_3a_growth_rate, saeule_3a_ter)
         
+        if profiler:
+            profiler.lap('3a_growth')
+
         # Apply TER and growth to regular wealth for Person 1
         p1_wealth = p1_wealth * (1 - wealth_ter)
         p1_wealth = p1_wealth * (1 + wealth_growth_rate)
         p1_wealth += (current_investment - current_3a if current_3a > 0 else current_investment)
         
+        if profiler:
+            profiler.lap('wealth_growth')
+
         # Calculate and subtract taxes for Bob (Person 2)
         p2_tax = calculate_total_tax(current_income, p2_wealth)
         p2_total_taxes += p2_tax
         p2_wealth -= p2_tax  # Subtract taxes from wealth
         
+        if profiler:
+            profiler.lap('tax')
+
         # Apply TER and growth to wealth for Person 2
         p2_wealth = p2_wealth * (1 - wealth_ter)
         p2_wealth = p2_wealth * (1 + wealth_growth_rate)
         p2_wealth += current_investment * (1 - wealth_ter)
         
+        if profiler:
+            profiler.lap('wealth_growth')
+
         # Handle retirement withdrawals (starting year 37)
         if year >= 37:
-            # Get Person 1's withdrawal amount for this year
-            p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
-            
             if p1_withdrawal > 0:
                 # Person 2 (Bob) - Always withdraws from wealth to match Alice
                 p2_wealth -= p1_withdrawal
-                p2_withdrawals.append({
+                p2_withdrawal_record = {
                     'Year': year,
                     'Amount': p1_withdrawal
-                })
+                }
                 
                 # Person 3 (Charly) - Special handling for year 37
                 if year == 37:
@@ -281,22 +909,22 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
                     
                     # Match Alice's withdrawal and add excess to wealth
                     p3_wealth += (after_tax_amount - p1_withdrawal)
-                    p3_withdrawals.append({
+                    p3_withdrawal_record = {
                         'Year': year,
                         'Amount': p1_withdrawal,
                         'From_3a': after_tax_amount,
                         'To_Wealth': after_tax_amount - p1_withdrawal
-                    })
+                    }
                     
                     p3_saeule_3a_accounts[0] = 0
                 else:
                     # Years 38-42: withdraw from wealth to match Alice
                     p3_wealth -= p1_withdrawal
-                    p3_withdrawals.append({
+                    p3_withdrawal_record = {
                         'Year': year,
                         'Amount': p1_withdrawal,
                         'From_Wealth': p1_withdrawal
-                    })
+                    }
 
         # Handle Person 4 (Dominic)
         if year >= 37 and year <= 41 and len(p4_active_accounts) > 0:
@@ -306,32 +934,31 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
             withdrawal_tax = calculate_saeule_3a_withdrawal_tax(account_balance)
             after_tax_amount = account_balance - withdrawal_tax
             
-            # Get Person 1's withdrawal for comparison
-            p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
-            
             # Match Alice's withdrawal and add excess to wealth
             p4_wealth += (after_tax_amount - p1_withdrawal)
-            p4_withdrawals.append({
+            p4_withdrawal_record = {
                 'Year': year,
                 'Amount': p1_withdrawal,
                 'From_3a': after_tax_amount,
                 'To_Wealth': after_tax_amount - p1_withdrawal
-            })
+            }
             
             p4_saeule_3a_accounts[account_to_close] = 0
             p4_active_accounts.pop(0)
         
         elif year == 42:
             # In year 42, withdraw from wealth to match Alice
-            p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
             if p1_withdrawal > 0:
                 p4_wealth -= p1_withdrawal
-                p4_withdrawals.append({
+                p4_withdrawal_record = {
                     'Year': year,
                     'Amount': p1_withdrawal,
                     'From_Wealth': p1_withdrawal
-                })
+                }
         
+        if profiler:
+            profiler.lap('withdrawals')
+
         # Handle regular investments and taxes for Charly and Dominic
         for person_idx, (income, wealth, active_accounts, saeule_3a_accounts) in enumerate(
             [(p3_income, p3_wealth, p3_active_accounts, p3_saeule_3a_accounts),
@@ -346,14 +973,18 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
                 p4_total_taxes += tax
                 p4_wealth -= tax
             
+            if profiler:
+                profiler.lap('tax')
+
             # Handle active 3a accounts
             if len(active_accounts) > 0:
                 contribution = current_3a if year < 37 else 0
-                for acc_idx in active_accounts:
-                    saeule_3a_accounts[acc_idx] *= (1 - saeule_3a_ter)
-                    saeule_3a_accounts[acc_idx] *= (1 + saeule_3a_growth_rate)
-                    saeule_3a_accounts[acc_idx] += contribution / len(active_accounts) * (1 - saeule_3a_ter)
+                grow_shared_3a_accounts(saeule_3a_accounts, active_accounts, contribution / len(active_accounts),
+                                        saeule_3a_growth_rate, saeule_3a_ter)
             
+            if profiler:
+                profiler.lap('3a_growth')
+
             # Apply TER and growth to regular wealth
             if person_idx == 0:  # Charly
                 p3_wealth *= (1 - wealth_ter)
@@ -364,9 +995,12 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
                 p4_wealth *= (1 + wealth_growth_rate)
                 p4_wealth += (current_investment - (current_3a if len(p4_active_accounts) > 0 else 0))
 
+            if profiler:
+                profiler.lap('wealth_growth')
+
         # Store history for all persons
         total_3a = sum(p1_saeule_3a_accounts)
-        p1_history.append({
+        p1_record = {
             'Year': year,
             'Wealth': p1_wealth,
             'Saeule_3a': total_3a,
@@ -375,34 +1009,37 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
             'Yearly_Tax': p1_tax,
             'Cumulative_Tax': p1_total_taxes,
             'Yearly_Withdrawal': yearly_withdrawal_amount
-        })
+        }
         
-        p2_history.append({
+        p2_record = {
             'Year': year,
             'Wealth': p2_wealth,
             'Yearly_Tax': p2_tax,
             'Cumulative_Tax': p2_total_taxes,
-            'Withdrawal': next((w['Amount'] for w in p2_withdrawals if w['Year'] == year), 0)
-        })
+            'Withdrawal': p2_withdrawal_record['Amount'] if p2_withdrawal_record else 0
+        }
         
-        p3_history.append({
+        p3_record = {
             'Year': year,
             'Wealth': p3_wealth,
             'Saeule_3a': sum(p3_saeule_3a_accounts),
             'Yearly_Tax': tax,
             'Cumulative_Tax': p3_total_taxes,
-            'Withdrawal': next((w['Amount'] for w in p3_withdrawals if w['Year'] == year), 0)
-        })
+            'Withdrawal': p3_withdrawal_record['Amount'] if p3_withdrawal_record else 0
+        }
         
-        p4_history.append({
+        p4_record = {
             'Year': year,
             'Wealth': p4_wealth,
             'Saeule_3a': sum(p4_saeule_3a_accounts),
             'Saeule_3a_Accounts': p4_saeule_3a_accounts.copy(),  # Store individual account balances
             'Yearly_Tax': tax,
             'Cumulative_Tax': p4_total_taxes,
-            'Withdrawal': next((w['Amount'] for w in p4_withdrawals if w['Year'] == year), 0)
-        })
+            'Withdrawal': p4_withdrawal_record['Amount'] if p4_withdrawal_record else 0
+        }
+
+        if profiler:
+            profiler.lap('history')
 
         # Handle Emily's strategy
         if year < 37:
@@ -411,6 +1048,9 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
             p5_total_taxes += p5_tax
             p5_wealth -= p5_tax
 
+            if profiler:
+                profiler.lap('tax')
+
             # Handle 3a accounts growth and contributions
             for acc_idx in p5_active_accounts:
                 p5_saeule_3a_accounts[acc_idx] *= (1 - saeule_3a_ter)
@@ -435,16 +1075,24 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
                 p5_saeule_3a_accounts.append(current_3a * (1 - saeule_3a_ter))
                 p5_active_accounts.append(len(p5_saeule_3a_accounts) - 1)
 
+            if profiler:
+                profiler.lap('3a_growth')
+
             # Apply TER and growth to regular wealth
             p5_wealth *= (1 - wealth_ter)
             p5_wealth *= (1 + wealth_growth_rate)
             p5_wealth += (current_investment - current_3a)
+            if profiler:
+                profiler.lap('wealth_growth')
 
         elif year >= 37:  # Retirement phase
             # Apply TER and growth to regular wealth first
             p5_wealth *= (1 - wealth_ter)
             p5_wealth *= (1 + wealth_growth_rate)
             
+            if profiler:
+                profiler.lap('wealth_growth')
+
             if len(p5_active_accounts) > 0:
                 # Still have 3a accounts to withdraw from
                 account_to_close = p5_active_accounts[0]
@@ -452,67 +1100,76 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
                 withdrawal_tax = calculate_saeule_3a_withdrawal_tax(account_balance)
                 after_tax_amount = account_balance - withdrawal_tax
                 
-                # Get Person 1's withdrawal for comparison
-                p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
-                
                 # Add excess to wealth
                 p5_wealth += (after_tax_amount - p1_withdrawal)
-                p5_withdrawals.append({
+                p5_withdrawal_record = {
                     'Year': year,
                     'Amount': p1_withdrawal,
                     'From_3a': after_tax_amount,
                     'To_Wealth': after_tax_amount - p1_withdrawal
-                })
+                }
                 
                 p5_saeule_3a_accounts[account_to_close] = 0
                 p5_active_accounts.pop(0)
             else:
                 # No more 3a accounts, withdraw from wealth
-                p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
                 if p1_withdrawal > 0:
                     p5_wealth -= p1_withdrawal
-                    p5_withdrawals.append({
+                    p5_withdrawal_record = {
                         'Year': year,
                         'Amount': p1_withdrawal,
                         'From_Wealth': p1_withdrawal
-                    })
+                    }
+
+            if profiler:
+                profiler.lap('withdrawals')
 
         # Store Emily's history
-        p5_history.append({
+        p5_record = {
             'Year': year,
             'Wealth': p5_wealth,
             'Saeule_3a': sum(p5_saeule_3a_accounts),
             'Saeule_3a_Accounts': p5_saeule_3a_accounts.copy(),
             'Yearly_Tax': p5_tax if year < 37 else 0,
             'Cumulative_Tax': p5_total_taxes,
-            'Withdrawal': next((w['Amount'] for w in p5_withdrawals if w['Year'] == year), 0)
-        })
+            'Withdrawal': p5_withdrawal_record['Amount'] if p5_withdrawal_record else 0
+        }
+
+        if profiler:
+            profiler.lap('history')
 
         # Handle Alice_adjusted similar to Alice but with adjusted contribution
+        p6_3a = current_3a if contribution_seed is None or year >= 37 else p6_contribution_limits[year - 1]
         if year < 37:
             # Calculate and subtract taxes
-            p6_tax = calculate_total_tax(current_income - current_3a, p6_wealth)
+            p6_tax = calculate_total_tax(current_income - p6_3a, p6_wealth)
             p6_total_taxes += p6_tax
             p6_wealth -= p6_tax
             
+            if profiler:
+                profiler.lap('tax')
+
             # Handle active 3a accounts with adjusted contribution
             if len(p6_active_accounts) > 0:
-                contribution_per_account = current_3a / len(p6_active_accounts)
+                contribution_per_account = p6_3a / len(p6_active_accounts)
             else:
                 contribution_per_account = 0
                 
-            for acc_idx in p6_active_accounts:
-                p6_saeule_3a_accounts[acc_idx] *= (1 - saeule_3a_ter)
-                p6_saeule_3a_accounts[acc_idx] *= (1 + saeule_3a_growth_rate)
-                p6_saeule_3a_accounts[acc_idx] += contribution_per_account * (1 - saeule_3a_ter)
+            grow_shared_3a_accounts(p6_saeule_3a_accounts, p6_active_accounts, contribution_per_account,
+                                    saeule_3a_growth_rate, saeule_3a_ter)
             
+            if profiler:
+                profiler.lap('3a_growth')
+
             # Apply TER and growth to regular wealth
             p6_wealth *= (1 - wealth_ter)
             p6_wealth *= (1 + wealth_growth_rate)
-            p6_wealth += (current_investment - current_3a)
+            p6_wealth += (current_investment - p6_3a)
+            if profiler:
+                profiler.lap('wealth_growth')
         
         # Store history for Alice_adjusted
-        p6_history.append({
+        p6_record = {
             'Year': year,
             'Wealth': p6_wealth,
             'Saeule_3a': sum(p6_saeule_3a_accounts),
@@ -521,58 +1178,139 @@ def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
             'Yearly_Tax': p6_tax if year < 37 else 0,
             'Cumulative_Tax': p6_total_taxes,
             'Yearly_Withdrawal': 0,
-            '3a_Contribution': current_3a
-        })
-
-    return p1_history, p2_history, p3_history, p4_history, p5_history, p6_history, withdrawal_history, p3_withdrawals, p4_withdrawals, p5_withdrawals
-
-def calculate_saeule_3a_withdrawal_tax(amount):
-    """Calculate tax due on Säule 3a withdrawal."""
-    tax_brackets = [
-        (50000, 0.047),
-        (100000, 0.056),
-        (150000, 0.066),
-        (200000, 0.075),
-        (250000, 0.084),
-        (300000, 0.093),
-        (350000, 0.102),
-        (400000, 0.111),
-        (450000, 0.120),
-        (500000, 0.129)
-    ]
+            '3a_Contribution': p6_3a
+        }
+
+        if profiler:
+            profiler.lap('history')
+
+        yield {
+            'Year': year,
+            'Alice': p1_record,
+            'Bob': p2_record,
+            'Charly': p3_record,
+            'Dominic': p4_record,
+            'Emily': p5_record,
+            'Alice_adjusted': p6_record,
+            'Withdrawals': {
+                'Alice': p1_withdrawal_record,
+                'Bob': p2_withdrawal_record,
+                'Charly': p3_withdrawal_record,
+                'Dominic': p4_withdrawal_record,
+                'Emily': p5_withdrawal_record,
+            },
+        }
+        if profiler:
+            profiler.restart()
+
+def simulate_investment_strategies(initial_income=100000, initial_wealth=120000,
+                                yearly_investment=20000, saeule_3a_contribution=7258,
+                                wealth_growth_rate=0.04, saeule_3a_growth_rate=0.04, 
+                                wealth_ter=0.001, saeule_3a_ter=0.004, years=42, num_3a_accounts=11,
+                                contribution_seed=None, columnar=False):
+    """Simulate and compare four investment strategies over time.
+
+    With `columnar=True` the per-person histories are ColumnarHistory objects
+    (NumPy columns, exportable with to_dataframe) instead of lists of dicts.
+    Use iter_investment_strategies to process the years one at a time instead.
+    `contribution_seed` selects a rising contribution limit path for
+    Alice_adjusted (see contribution_limit_paths); None keeps her contribution fixed.
+    """
+    def new_history(account_columns=0):
+        if columnar:
+            return ColumnarHistory(years, account_columns)
+        return YearIndexedHistory()
+
+    histories = {
+        'Alice': new_history(num_3a_accounts),
+        'Bob': new_history(),
+        'Charly': new_history(),
+        'Dominic': new_history(5),
+        'Emily': new_history(1),
+        'Alice_adjusted': new_history(num_3a_accounts),
+    }
+    withdrawal_logs = {name: YearIndexedHistory() for name in ('Alice', 'Bob', 'Charly', 'Dominic', 'Emily')}
+
+    profiler = _active_profiler
+    for state in iter_investment_strategies(initial_income, initial_wealth, yearly_investment,
+                                            saeule_3a_contribution, wealth_growth_rate, saeule_3a_growth_rate,
+                                            wealth_ter, saeule_3a_ter, years, num_3a_accounts, contribution_seed):
+        if profiler:
+            profiler.restart()
+        for name, history in histories.items():
+            history.append(state[name])
+        for name, record in state['Withdrawals'].items():
+            if record is not None:
+                withdrawal_logs[name].append(record)
+        if profiler:
+            profiler.lap('history')
+
+    return (histories['Alice'], histories['Bob'], histories['Charly'], histories['Dominic'], histories['Emily'],
+            histories['Alice_adjusted'], withdrawal_logs['Alice'], withdrawal_logs['Charly'],
+            withdrawal_logs['Dominic'], withdrawal_logs['Emily'])
+
+def calculate_saeule_3a_withdrawal_tax(amount, year_total=None):
+    """Calculate tax due on Säule 3a withdrawal.
+
+    Withdrawals of the same tax year (e.g. both spouses' in a household) are
+    taxed together: `year_total` is their sum including this one and sets the
+    rate; by default the amount is the year's only withdrawal.
+    """
+    tax_brackets = SAEULE_3A_WITHDRAWAL_TAX_BRACKETS
+    rate_base = amount if year_total is None else year_total
     
     # Find applicable tax rate
     tax_rate = tax_brackets[-1][1]  # Default to highest rate
     for threshold, rate in tax_brackets:
-        if amount <= threshold:
+        if rate_base <= threshold:
             tax_rate = rate
             break
     
     return amount * tax_rate
 
+def calculate_saeule_3a_withdrawal_tax_vectorized(amounts, year_totals=None):
+    """Calculate Säule 3a withdrawal tax for an array of withdrawal amounts.
+
+    `year_totals` (broadcast against amounts) are the sums of all withdrawals
+    of the same tax year that set the rate, as in calculate_saeule_3a_withdrawal_tax.
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    rate_base = amounts if year_totals is None else np.asarray(year_totals, dtype=float)
+    
+    # First threshold the amount fits under, highest rate beyond the last one
+    bracket = np.searchsorted(_WITHDRAWAL_TAX_THRESHOLDS, rate_base, side='left')
+    bracket = np.minimum(bracket, len(_WITHDRAWAL_TAX_RATES) - 1)
+    
+    return amounts * _WITHDRAWAL_TAX_RATES[bracket]
+
 def plot_retirement_phase(withdrawal_history, p2_history, p3_history, p4_history, p5_history, p3_withdrawals, p4_withdrawals, p5_withdrawals):
     """Create a visualization of retirement phase withdrawals."""
+    import matplotlib.pyplot as plt
+
+    withdrawal_history, p2_history, p3_history, p4_history, p5_history, p3_withdrawals, p4_withdrawals, p5_withdrawals = (
+        as_year_indexed(records) for records in (withdrawal_history, p2_history, p3_history, p4_history, p5_history,
+                                                 p3_withdrawals, p4_withdrawals, p5_withdrawals))
     retirement_years = range(37, 43)
     retirement_ages = [year + 28 for year in retirement_years]
     
     # Collect withdrawal data
-    p1_withdrawals = [next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
+    p1_withdrawals = [withdrawal_history.value_for_year(year, 'After_Tax')
                      for year in retirement_years]
     
     # Get actual withdrawal amounts from history
-    p2_withdrawals = [next((h['Withdrawal'] for h in p2_history if h['Year'] == year), 0)
+    p2_withdrawals = [p2_history.value_for_year(year, 'Withdrawal')
                      for year in retirement_years]
     
     # For Charly, get both matched withdrawals and additional money to wealth
     p3_matched = []
     p3_additional = []
     for year in retirement_years:
-        withdrawal = next((h['Withdrawal'] for h in p3_history if h['Year'] == year), 0)
+        withdrawal = p3_history.value_for_year(year, 'Withdrawal')
         p3_matched.append(withdrawal)
         
         # Get the additional amount that goes to wealth (if any)
         if year == 37:  # Only in first retirement year
-            from_3a = next((w['From_3a'] for w in p3_withdrawals if w['Year'] == year), 0)
+            from_3a = p3_withdrawals.value_for_year(year, 'From_3a')
             to_wealth = from_3a - withdrawal if from_3a > withdrawal else 0
             p3_additional.append(to_wealth)
         else:
@@ -582,11 +1320,11 @@ def plot_retirement_phase(withdrawal_history, p2_history, p3_history, p4_history
     p4_matched = []
     p4_additional = []
     for year in retirement_years:
-        withdrawal = next((h['Withdrawal'] for h in p4_history if h['Year'] == year), 0)
+        withdrawal = p4_history.value_for_year(year, 'Withdrawal')
         p4_matched.append(withdrawal)
         
         # Get the additional amount that goes to wealth (if any)
-        p4_withdrawal = next((w for w in p4_withdrawals if w['Year'] == year), None)
+        p4_withdrawal = p4_withdrawals.for_year(year)
         if p4_withdrawal and 'From_3a' in p4_withdrawal:
             from_3a = p4_withdrawal['From_3a']
             to_wealth = from_3a - withdrawal if from_3a > withdrawal else 0
@@ -598,11 +1336,11 @@ def plot_retirement_phase(withdrawal_history, p2_history, p3_history, p4_history
     p5_matched = []
     p5_additional = []
     for year in retirement_years:
-        withdrawal = next((h['Withdrawal'] for h in p5_history if h['Year'] == year), 0)
+        withdrawal = p5_history.value_for_year(year, 'Withdrawal')
         p5_matched.append(withdrawal)
         
         # Get the additional amount that goes to wealth (if any)
-        p5_withdrawal = next((w for w in p5_withdrawals if w['Year'] == year), None)
+        p5_withdrawal = p5_withdrawals.for_year(year)
         if p5_withdrawal and 'From_3a' in p5_withdrawal:
             from_3a = p5_withdrawal['From_3a']
             to_wealth = from_3a - withdrawal if from_3a > withdrawal else 0
@@ -680,6 +1418,8 @@ def plot_retirement_phase(withdrawal_history, p2_history, p3_history, p4_history
 
 def plot_wealth_development(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history):
     """Create a visualization of total wealth development over time."""
+    import matplotlib.pyplot as plt
+
     years = [entry['Year'] for entry in p1_history]
     ages = [year + 28 for year in years]  # Convert years to ages
     
@@ -742,19 +1482,19 @@ def plot_wealth_development(p1_history, p2_history, p3_history, p4_history, p5_h
 
 def plot_final_years(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history):
     """Create a visualization focusing on the final two years of wealth differences compared to Bob."""
+    import matplotlib.pyplot as plt
+
     final_years = [41, 42]
     ages = [year + 28 for year in final_years]
     
     # Get wealth data for final years
     def get_final_wealth(history, has_3a=True):
+        history = as_year_indexed(history)
+        entries = [history.for_year(year) for year in final_years]
         if has_3a:
-            return [next((entry['Wealth'] + entry['Saeule_3a'] 
-                         for entry in history if entry['Year'] == year), 0)
-                    for year in final_years]
+            return [entry['Wealth'] + entry['Saeule_3a'] if entry is not None else 0 for entry in entries]
         else:
-            return [next((entry['Wealth']
-                         for entry in history if entry['Year'] == year), 0)
-                    for year in final_years]
+            return [entry['Wealth'] if entry is not None else 0 for entry in entries]
     
     # Get wealth values for all strategies
     p1_wealth = get_final_wealth(p1_history, has_3a=True)
@@ -820,8 +1560,32 @@ def plot_final_years(p1_history, p2_history, p3_history, p4_history, p5_history,
     
     return plt.gcf()
 
-def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history, withdrawal_history, p3_withdrawals, p4_withdrawals, p5_withdrawals, saeule_3a_contribution=7258):
-    """Print detailed comparison of both strategies."""
+def summarize_simulation(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history, withdrawal_history, p3_withdrawals=None, p4_withdrawals=None, p5_withdrawals=None):
+    """Summarize a simulation run into final metrics per strategy (as reported by print_comparison)."""
+    summary = {}
+    for name, history in [('Alice', p1_history), ('Bob', p2_history), ('Charly', p3_history),
+                          ('Dominic', p4_history), ('Emily', p5_history), ('Alice_adjusted', p6_history)]:
+        last = history[-1]
+        summary[f'{name}_Total'] = last['Wealth'] + last.get('Saeule_3a', 0)
+        summary[f'{name}_Tax'] = last['Cumulative_Tax']
+    summary['Alice_Withdrawal_Tax'] = sum(w['Tax'] for w in withdrawal_history)
+    
+    # Same comparison as the 'Total advantage of Säule 3a strategy' line
+    tax_difference = p2_history[-1]['Cumulative_Tax'] - p1_history[-1]['Cumulative_Tax']
+    asset_difference = summary['Alice_Total'] - p2_history[-1]['Wealth']
+    summary['Saeule_3a_Advantage'] = tax_difference + asset_difference
+    
+    return summary
+
+def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history, withdrawal_history, p3_withdrawals, p4_withdrawals, p5_withdrawals, saeule_3a_contribution=7258, plot=True):
+    """Print detailed comparison of both strategies.
+
+    With `plot=False` only the tables are printed; no figures are created and
+    matplotlib is never imported.
+    """
+    p1_history, p2_history, p3_history, p4_history, p5_history, p6_history, withdrawal_history, p4_withdrawals, p5_withdrawals = (
+        as_year_indexed(records) for records in (p1_history, p2_history, p3_history, p4_history, p5_history, p6_history,
+                                                 withdrawal_history, p4_withdrawals, p5_withdrawals))
     print("\n=== Investment Strategy Comparison (0.39% TER only on Säule 3a) ===")
     print("-" * 100)
     print(f"{'Year':^6} | {'Alice (with Säule 3a)':^45} | {'Bob (without Säule 3a)':^45}")
@@ -848,8 +1612,8 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
     print("-" * 100)
     
     for year in range(30, 43):
-        p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
-        p2_data = next((h for h in p2_history if h['Year'] == year), None)
+        p1_withdrawal = withdrawal_history.value_for_year(year, 'After_Tax')
+        p2_data = p2_history.for_year(year)
         p2_withdrawal = p2_data['Yearly_Tax'] if p2_data else 0
         p2_wealth = p2_data['Wealth'] if p2_data else 0
         
@@ -895,8 +1659,8 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
     print("-" * 120)
     
     for year in range(30, 43):
-        p1_data = next((h for h in p1_history if h['Year'] == year), None)
-        withdrawal = next((w for w in withdrawal_history if w['Year'] == year), None)
+        p1_data = p1_history.for_year(year)
+        withdrawal = withdrawal_history.for_year(year)
         
         if p1_data:
             before_tax = withdrawal['Balance'] if withdrawal else 0
@@ -914,8 +1678,8 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
     print("-" * 120)
     
     for year in range(30, 43):
-        p2_data = next((h for h in p2_history if h['Year'] == year), None)
-        p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
+        p2_data = p2_history.for_year(year)
+        p1_withdrawal = withdrawal_history.value_for_year(year, 'After_Tax')
         
         if p2_data:
             # Only show withdrawals during retirement
@@ -933,8 +1697,8 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
     print("-" * 140)
     
     for year in range(30, 43):
-        p3_data = next((h for h in p3_history if h['Year'] == year), None)
-        p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
+        p3_data = p3_history.for_year(year)
+        p1_withdrawal = withdrawal_history.value_for_year(year, 'After_Tax')
         
         if p3_data:
             # Only show withdrawals during retirement
@@ -956,10 +1720,10 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
     print("-" * 160)
     
     for year in range(37, 43):
-        p4_data = next((h for h in p4_history if h['Year'] == year), None)
-        prev_p4_data = next((h for h in p4_history if h['Year'] == year-1), None)
-        p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
-        p4_withdrawal = next((w for w in p4_withdrawals if w['Year'] == year), None)
+        p4_data = p4_history.for_year(year)
+        prev_p4_data = p4_history.for_year(year-1)
+        p1_withdrawal = withdrawal_history.value_for_year(year, 'After_Tax')
+        p4_withdrawal = p4_withdrawals.for_year(year)
         
         if p4_data and prev_p4_data:
             if year <= 41:  # Years with 3a withdrawals
@@ -991,7 +1755,7 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
     print("-" * 160)
     
     for year in range(30, 43):
-        p4_data = next((h for h in p4_history if h['Year'] == year), None)
+        p4_data = p4_history.for_year(year)
         if p4_data:
             accounts = p4_data.get('Saeule_3a_Accounts', [0, 0, 0, 0, 0])  # Get individual account balances
             total_3a = sum(accounts)
@@ -1012,10 +1776,10 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
     print("-" * 160)
     
     for year in range(37, 43):
-        p5_data = next((h for h in p5_history if h['Year'] == year), None)
-        prev_p5_data = next((h for h in p5_history if h['Year'] == year-1), None)
-        p1_withdrawal = next((w['After_Tax'] for w in withdrawal_history if w['Year'] == year), 0)
-        p5_withdrawal = next((w for w in p5_withdrawals if w['Year'] == year), None)
+        p5_data = p5_history.for_year(year)
+        prev_p5_data = p5_history.for_year(year-1)
+        p1_withdrawal = withdrawal_history.value_for_year(year, 'After_Tax')
+        p5_withdrawal = p5_withdrawals.for_year(year)
         
         if p5_data and prev_p5_data:
             if p5_withdrawal and 'From_3a' in p5_withdrawal:  # Years with 3a withdrawals
@@ -1047,7 +1811,7 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
     print("-" * 160)
     
     for year in range(30, 43):
-        p5_data = next((h for h in p5_history if h['Year'] == year), None)
+        p5_data = p5_history.for_year(year)
         if p5_data:
             accounts = p5_data.get('Saeule_3a_Accounts', [])  # Get individual account balances
             # Pad with zeros if less than 5 accounts
@@ -1071,7 +1835,7 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
     
     base_contribution = saeule_3a_contribution
     for year in range(30, 43):
-        p6_data = next((h for h in p6_history if h['Year'] == year), None)
+        p6_data = p6_history.for_year(year)
         if p6_data:
             adjusted_contribution = p6_data.get('3a_Contribution', 0)
             increase_percent = ((adjusted_contribution / base_contribution) - 1) * 100 if adjusted_contribution > 0 else 0
@@ -1084,10 +1848,13 @@ def print_comparison(p1_history, p2_history, p3_history, p4_history, p5_history,
                   f"{p6_data['Wealth']:14,.2f}")
     
     # Keep the visualization calls
-    plot_retirement_phase(withdrawal_history, p2_history, p3_history, p4_history, p5_history, p3_withdrawals, p4_withdrawals, p5_withdrawals)
-    plot_wealth_development(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history)
-    plot_final_years(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history)
-    plt.show()
+    if plot:
+        import matplotlib.pyplot as plt
+
+        plot_retirement_phase(withdrawal_history, p2_history, p3_history, p4_history, p5_history, p3_withdrawals, p4_withdrawals, p5_withdrawals)
+        plot_wealth_development(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history)
+        plot_final_years(p1_history, p2_history, p3_history, p4_history, p5_history, p6_history)
+        plt.show()
 
 if __name__ == "__main__":
     # Run the simulation with 11 Säule 3a accounts
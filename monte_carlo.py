@@ -0,0 +1,102 @@
+"""Monte Carlo simulation of the investment strategies with stochastic yearly returns."""
+import numpy as np
+import pandas as pd
+
+from batch_simulation import STRATEGY_NAMES, simulate_investment_strategies_batch
+
+DISTRIBUTIONS = ('normal', 'lognormal', 'bootstrap')
+
+def _returns_from_normals(normals, distribution, mean, volatility):
+    """Turn standard normal draws into yearly returns with the given mean and volatility."""
+    if distribution == 'normal':
+        return mean + volatility * normals
+
+    # Lognormal gross return (1 + r) with matching mean and standard deviation
+    gross_mean = 1 + mean
+    sigma_squared = np.log(1 + (volatility / gross_mean) ** 2)
+    mu = np.log(gross_mean) - sigma_squared / 2
+    return np.exp(mu + np.sqrt(sigma_squared) * normals) - 1
+
+def generate_return_paths(n_paths, years, distribution='normal', wealth_mean=0.04, saeule_3a_mean=0.04,
+                          volatility=0.15, saeule_3a_volatility=None, correlation=1.0,
+                          historical_returns=None, saeule_3a_historical_returns=None, rng=None):
+    """Draw (n_paths, years) yearly return paths for free wealth and for the 3a accounts.
+
+    'normal' and 'lognormal' returns have the given means and volatilities, with
+    `correlation` between the wealth and 3a draws of the same year. 'bootstrap'
+    resamples years from `historical_returns` with replacement; both paths use
+    the same sampled years so their historical co-movement is kept.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown return distribution '{distribution}', expected one of {DISTRIBUTIONS}")
+    rng = np.random.default_rng(rng)
+
+    if distribution == 'bootstrap':
+        if historical_returns is None:
+            raise ValueError("Bootstrapped returns need a historical_returns series")
+        wealth_series = np.asarray(historical_returns, dtype=float)
+        saeule_3a_series = (wealth_series if saeule_3a_historical_returns is None
+                            else np.asarray(saeule_3a_historical_returns, dtype=float))
+        sampled_years = rng.integers(0, len(wealth_series), size=(n_paths, years))
+        return wealth_series[sampled_years], saeule_3a_series[sampled_years]
+
+    if saeule_3a_volatility is None:
+        saeule_3a_volatility = volatility
+    wealth_normals = rng.standard_normal((n_paths, years))
+    if correlation == 1.0:
+        saeule_3a_normals = wealth_normals
+    else:
+        saeule_3a_normals = (correlation * wealth_normals
+                             + np.sqrt(1 - correlation ** 2) * rng.standard_normal((n_paths, years)))
+
+    return (_returns_from_normals(wealth_normals, distribution, wealth_mean, volatility),
+            _returns_from_normals(saeule_3a_normals, distribution, saeule_3a_mean, saeule_3a_volatility))
+
+def simulate_final_wealth_paths(n_paths=100000, distribution='normal', volatility=0.15,
+                                saeule_3a_volatility=None, correlation=1.0, historical_returns=None,
+                                saeule_3a_historical_returns=None, chunk_size=10000, seed=None,
+                                **simulation_params):
+    """Simulate n_paths stochastic return paths and return final total wealth per strategy.
+
+    The remaining keyword arguments are passed to the batched simulation;
+    `wealth_growth_rate` and `saeule_3a_growth_rate` become the mean yearly
+    returns. Paths are generated and simulated in chunks of `chunk_size`, so
+    memory stays bounded regardless of n_paths. Returns an (n_paths, persons)
+    array of final wealth plus remaining Säule 3a, ordered as STRATEGY_NAMES.
+    """
+    years = simulation_params.pop('years', 42)
+    wealth_mean = simulation_params.pop('wealth_growth_rate', 0.04)
+    saeule_3a_mean = simulation_params.pop('saeule_3a_growth_rate', 0.04)
+    rng = np.random.default_rng(seed)
+
+    final_wealth = np.empty((n_paths, len(STRATEGY_NAMES)))
+    for start in range(0, n_paths, chunk_size):
+        stop = min(start + chunk_size, n_paths)
+        wealth_returns, saeule_3a_returns = generate_return_paths(
+            stop - start, years, distribution=distribution, wealth_mean=wealth_mean,
+            saeule_3a_mean=saeule_3a_mean, volatility=volatility, saeule_3a_volatility=saeule_3a_volatility,
+            correlation=correlation, historical_returns=historical_returns,
+            saeule_3a_historical_returns=saeule_3a_historical_returns, rng=rng)
+
+        result = simulate_investment_strategies_batch(
+            wealth_growth_rate=wealth_returns, saeule_3a_growth_rate=saeule_3a_returns,
+            years=years, record_history=False, **simulation_params)
+        final_wealth[start:stop] = result['Wealth'][:, :, -1] + result['Saeule_3a'][:, :, -1]
+
+    return final_wealth
+
+def percentile_bands(final_wealth, percentiles=(5, 25, 50, 75, 95)):
+    """Summarize final wealth samples as percentile bands per strategy."""
+    bands = pd.DataFrame(np.percentile(final_wealth, percentiles, axis=0).T,
+                         index=pd.Index(STRATEGY_NAMES, name='Strategy'),
+                         columns=[f'P{p:g}' for p in percentiles])
+    bands['Mean'] = final_wealth.mean(axis=0)
+    return bands
+
+def simulate_monte_carlo(n_paths=100000, percentiles=(5, 25, 50, 75, 95), **kwargs):
+    """Run a Monte Carlo simulation and report percentile bands of final wealth per strategy.
+
+    Accepts the arguments of simulate_final_wealth_paths.
+    """
+    final_wealth = simulate_final_wealth_paths(n_paths=n_paths, **kwargs)
+    return percentile_bands(final_wealth, percentiles)
@@ -0,0 +1,279 @@
+"""Search for the 3a account count, withdrawal start and contribution split with the highest final wealth."""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from investements_vs_saeule_3_a import (
+    SAEULE_3A_WITHDRAWAL_TAX_BRACKETS,
+    calculate_saeule_3a_withdrawal_tax,
+    calculate_saeule_3a_withdrawal_tax_vectorized,
+    calculate_total_tax_vectorized,
+)
+from strategies import DirectInvestmentStrategy, StaggeredWithdrawalStrategy, Strategy, run_strategies
+
+# Contribution splits over the open accounts (in withdrawal order):
+#   'tilt' - account k gets a share proportional to split_parameter ** k (1.0 = equal split)
+#   'cap'  - fill accounts in order so each ends just below split_parameter CHF at its withdrawal
+SPLIT_RULES = ('tilt', 'cap')
+DEFAULT_TILTS = (0.7, 0.8, 0.9, 1.0, 1.1, 1.25, 1.5)
+WITHDRAWAL_TAX_THRESHOLDS = tuple(threshold for threshold, _ in SAEULE_3A_WITHDRAWAL_TAX_BRACKETS)
+
+# Capped accounts stay this far below the bracket threshold so rounding cannot push them over
+CAP_MARGIN = 1.0
+
+class Schedule(namedtuple('Schedule', [
+        'num_3a_accounts', 'first_withdrawal_year', 'split_rule', 'split_parameter',
+        'withdrawal_years', 'withdrawal_balances', 'withdrawal_taxes', 'final_wealth'])):
+    """A withdrawal schedule with its per-account withdrawals and final after-tax wealth."""
+
+    def to_strategy(self, name='Optimized'):
+        """Return the schedule as a strategy for strategies.run_strategies."""
+        return SplitScheduleStrategy(name, self.num_3a_accounts, self.first_withdrawal_year,
+                                     self.split_rule, self.split_parameter)
+
+class SplitScheduleStrategy(StaggeredWithdrawalStrategy):
+    """One account closed per year from `first_withdrawal_year`, contributions split by a SPLIT_RULES rule."""
+
+    def __init__(self, name, num_accounts, first_withdrawal_year, split_rule='tilt', split_parameter=1.0):
+        if split_rule not in SPLIT_RULES:
+            raise ValueError(f"Unknown split rule '{split_rule}', expected one of {SPLIT_RULES}")
+        super().__init__(name, num_accounts, first_withdrawal_year=first_withdrawal_year)
+        self.split_rule = split_rule
+        self.split_parameter = split_parameter
+
+    def checkpoint_key(self, year, retirement_year):
+        # The cap rule sizes contributions by the withdrawal year from the start
+        if self.split_rule == 'cap':
+            return Strategy.checkpoint_key(self, year, retirement_year)
+        return super().checkpoint_key(year, retirement_year)
+
+    def allocate_contribution(self, ctx, state, amount, new_accounts=()):
+        if not state.active:
+            return {}
+        if self.split_rule == 'tilt':
+            open_weight = 0
+            for acc_idx in state.active:
+                open_weight += self.split_parameter ** acc_idx
+            return {acc_idx: amount * self.split_parameter ** acc_idx / open_weight for acc_idx in state.active}
+
+        # Top up each account to what grows into the cap by its withdrawal, the last one takes the rest
+        growth = (1 - ctx.saeule_3a_ter) * (1 + ctx.saeule_3a_growth_rate)
+        allocation = {}
+        remaining = amount
+        for acc_idx in state.active[:-1]:
+            periods = self.first_withdrawal_year + acc_idx - 1 - ctx.year
+            room = (self.split_parameter - CAP_MARGIN) / growth ** periods - state.accounts[acc_idx]
+            allocation[acc_idx] = min(max(room / (1 - ctx.saeule_3a_ter), 0), remaining)
+            remaining -= allocation[acc_idx]
+        allocation[state.active[-1]] = remaining
+        return allocation
+
+def _split_contributions(amount, balances, open_accounts, withdrawal_years, year, is_cap, split_parameter,
+                         tilt_weights, growth_powers, lowest_period, saeule_3a_ter):
+    """Vectorized SplitScheduleStrategy.allocate_contribution for (M, accounts) candidates.
+
+    growth_powers[k] is the yearly 3a growth to the power lowest_period + k.
+    """
+    n, columns = balances.shape
+    deposits = np.zeros((n, columns))
+
+    # Tilted split, open weights summed in account order
+    open_weights = np.where(open_accounts, tilt_weights, 0.0)
+    open_weight = np.zeros(n)
+    for acc_idx in range(columns):
+        open_weight += open_weights[:, acc_idx]
+    tilted = amount * open_weights / np.where(open_weight > 0, open_weight, 1.0)[:, None]
+
+    # Capped split; accounts close from the front, so the last open account is always the last one
+    remaining = np.full(n, float(amount))
+    last_account = open_accounts.shape[1] - 1 - np.argmax(open_accounts[:, ::-1], axis=1)
+    for acc_idx in range(columns):
+        periods = withdrawal_years[:, acc_idx] - 1 - year
+        room = (split_parameter - CAP_MARGIN) / growth_powers[periods - lowest_period] - balances[:, acc_idx]
+        take = np.where(acc_idx == last_account, remaining,
+                        np.minimum(np.maximum(room / (1 - saeule_3a_ter), 0), remaining))
+        take = np.where(is_cap & open_accounts[:, acc_idx], take, 0.0)
+        deposits[:, acc_idx] = take
+        remaining -= take
+
+    return np.where(is_cap[:, None], deposits, tilted)
+
+def evaluate_schedules(num_3a_accounts, first_withdrawal_year, split_rule='tilt', split_parameter=1.0,
+                       initial_income=100000, initial_wealth=120000, yearly_investment=20000,
+                       saeule_3a_contribution=7258, wealth_growth_rate=0.04, saeule_3a_growth_rate=0.04,
+                       wealth_ter=0.001, saeule_3a_ter=0.004, years=42, retirement_year=37,
+                       return_details=False):
+    """Final after-tax wealth of M candidate schedules, all advanced together year by year.
+
+    `num_3a_accounts`, `first_withdrawal_year`, `split_rule` and
+    `split_parameter` are scalars or (M,) arrays describing the candidates.
+    Each candidate follows Alice's rules (taxes, TER, growth, one account
+    closed per year) but keeps every after-tax withdrawal in its wealth, so
+    candidates are compared without having to match another strategy.
+    Accounts still open after `years` are withdrawn together and taxed as
+    one withdrawal. Rates must be constant. Results equal
+    `schedule_final_wealth` for the same schedule exactly.
+
+    Returns an (M,) array of final wealth; with `return_details` also (M,
+    accounts) arrays of withdrawal balances and withdrawal taxes.
+    """
+    num_accounts = np.atleast_1d(np.asarray(num_3a_accounts, dtype=int))
+    first_year = np.atleast_1d(np.asarray(first_withdrawal_year, dtype=int))
+    split_rule = np.atleast_1d(np.asarray(split_rule))
+    split_parameter = np.atleast_1d(np.asarray(split_parameter, dtype=float))
+    n = np.broadcast_shapes(num_accounts.shape, first_year.shape, split_rule.shape, split_parameter.shape)[0]
+    num_accounts, first_year, split_rule, split_parameter = (
+        np.broadcast_to(value, (n,)) for value in (num_accounts, first_year, split_rule, split_parameter))
+    unknown = set(split_rule.tolist()) - set(SPLIT_RULES)
+    if unknown:
+        raise ValueError(f"Unknown split rule(s) {sorted(unknown)}, expected one of {SPLIT_RULES}")
+    is_cap = split_rule == 'cap'
+
+    columns = max(int(num_accounts.max(initial=1)), 1)
+    account_idx = np.arange(columns)
+    withdrawal_years = first_year[:, None] + account_idx
+    open_accounts = account_idx < num_accounts[:, None]
+    # Scalar powers like SplitScheduleStrategy; numpy's array power can differ in the last ulp
+    tilts, tilt_rows = np.unique(np.where(is_cap, 1.0, split_parameter), return_inverse=True)
+    tilt_weights = np.array([[tilt ** acc_idx for acc_idx in range(columns)] for tilt in tilts.tolist()])[tilt_rows]
+    growth = (1 - saeule_3a_ter) * (1 + saeule_3a_growth_rate)
+    # Growth over every period the cap rule can look ahead, as scalar powers for the same reason
+    lowest_period = int(withdrawal_years.min()) - 1 - years
+    growth_powers = np.array([growth ** period for period in range(lowest_period, int(withdrawal_years.max()))])
+
+    wealth = np.full(n, float(initial_wealth))
+    balances = np.zeros((n, columns))
+    withdrawal_balances = np.zeros((n, columns))
+    withdrawal_taxes = np.zeros((n, columns))
+
+    for year in range(1, years + 1):
+        retired = year >= retirement_year
+        current_income = 0 if retired else initial_income
+        current_investment = 0 if retired else yearly_investment
+        current_3a = 0 if retired else saeule_3a_contribution
+
+        # At most one account per candidate closes in a year
+        closing = open_accounts & (withdrawal_years == year)
+        if closing.any():
+            closed_balance = np.where(closing, balances, 0.0)
+            closed_tax = np.where(closing, calculate_saeule_3a_withdrawal_tax_vectorized(closed_balance), 0.0)
+            wealth += (closed_balance - closed_tax).sum(axis=1)
+            withdrawal_balances += closed_balance
+            withdrawal_taxes += closed_tax
+            balances[closing] = 0
+            open_accounts = open_accounts & ~closing
+
+        wealth -= calculate_total_tax_vectorized(np.full(n, current_income - current_3a), wealth)
+
+        balances = np.where(open_accounts, balances * (1 - saeule_3a_ter) * (1 + saeule_3a_growth_rate), balances)
+        if current_3a > 0:
+            deposits = _split_contributions(current_3a, balances, open_accounts, withdrawal_years, year,
+                                            is_cap, split_parameter, tilt_weights, growth_powers, lowest_period,
+                                            saeule_3a_ter)
+            balances += deposits * (1 - saeule_3a_ter)
+
+        wealth = wealth * (1 - wealth_ter)
+        wealth = wealth * (1 + wealth_growth_rate)
+        wealth += current_investment - current_3a
+
+    # Liquidate what is left at the end of the horizon as a single withdrawal
+    remaining = np.zeros(n)
+    for acc_idx in range(columns):
+        remaining += balances[:, acc_idx]
+    final_wealth = wealth + remaining - calculate_saeule_3a_withdrawal_tax_vectorized(remaining)
+
+    if return_details:
+        return final_wealth, withdrawal_balances, withdrawal_taxes
+    return final_wealth
+
+def _candidate_grid(account_counts, first_withdrawal_years, split_rules):
+    """Cartesian product of account counts, first withdrawal years and (rule, parameter) splits."""
+    rows = [(count, first_year, rule, parameter)
+            for count in account_counts for first_year in first_withdrawal_years
+            for rule, parameter in split_rules]
+    return pd.DataFrame(rows, columns=['num_3a_accounts', 'first_withdrawal_year', 'split_rule', 'split_parameter'])
+
+def rank_schedules(account_counts=range(1, 21), first_withdrawal_years=None, tilts=DEFAULT_TILTS,
+                   caps=WITHDRAWAL_TAX_THRESHOLDS, refine=5, **params):
+    """Evaluate a grid of schedules and return them sorted by final after-tax wealth.
+
+    The grid covers every account count, first withdrawal year (default: the
+    five years before retirement and the retirement year itself) and
+    contribution split: tilted splits for each value in `tilts` and capped
+    splits at each withdrawal tax bracket threshold in `caps`. Caps that the
+    3a contributions can never reach behave like the single-account case and
+    are skipped. The `refine` best (count, year) pairs then get a finer tilt
+    grid around their best tilt. Remaining keyword arguments are passed to
+    evaluate_schedules.
+    """
+    years = params.get('years', 42)
+    retirement_year = params.get('retirement_year', 37)
+    if first_withdrawal_years is None:
+        first_withdrawal_years = range(max(retirement_year - 5, 1), min(retirement_year, years) + 1)
+
+    # Largest balance any account can reach: every contribution in one account until the end
+    growth = (1 - params.get('saeule_3a_ter', 0.004)) * (1 + params.get('saeule_3a_growth_rate', 0.04))
+    contribution = params.get('saeule_3a_contribution', 7258) * (1 - params.get('saeule_3a_ter', 0.004))
+    max_balance = sum(contribution * growth ** (years - year) for year in range(1, min(retirement_year, years + 1)))
+    splits = [('tilt', tilt) for tilt in tilts] + [('cap', cap) for cap in caps if cap < max_balance]
+
+    candidates = _candidate_grid(account_counts, first_withdrawal_years, splits)
+    candidates['final_wealth'] = evaluate_schedules(
+        candidates['num_3a_accounts'].to_numpy(), candidates['first_withdrawal_year'].to_numpy(),
+        candidates['split_rule'].to_numpy(), candidates['split_parameter'].to_numpy(), **params)
+
+    # Refine the tilt of the most promising (count, year) pairs only
+    tilted = candidates[candidates['split_rule'] == 'tilt']
+    if refine and len(tilts) > 1 and len(tilted):
+        grid = np.sort(np.asarray(tilts, dtype=float))
+        best_pairs = (tilted.sort_values('final_wealth', ascending=False)
+                      .drop_duplicates(['num_3a_accounts', 'first_withdrawal_year']).head(refine))
+        refined = []
+        for row in best_pairs.itertuples():
+            position = np.searchsorted(grid, row.split_parameter)
+            low, high = grid[max(position - 1, 0)], grid[min(position + 1, len(grid) - 1)]
+            refined.append(_candidate_grid([row.num_3a_accounts], [row.first_withdrawal_year],
+                                           [('tilt', tilt) for tilt in np.linspace(low, high, 9)]))
+        refined = pd.concat(refined, ignore_index=True)
+        refined['final_wealth'] = evaluate_schedules(
+            refined['num_3a_accounts'].to_numpy(), refined['first_withdrawal_year'].to_numpy(),
+            refined['split_rule'].to_numpy(), refined['split_parameter'].to_numpy(), **params)
+        candidates = pd.concat([candidates, refined], ignore_index=True)
+
+    return candidates.sort_values('final_wealth', ascending=False, kind='stable').reset_index(drop=True)
+
+def optimize_schedule(account_counts=range(1, 21), first_withdrawal_years=None, tilts=DEFAULT_TILTS,
+                      caps=WITHDRAWAL_TAX_THRESHOLDS, refine=5, **params):
+    """Find the schedule with the highest final after-tax wealth.
+
+    Accepts the arguments of rank_schedules and returns the best Schedule,
+    including the year, balance and withdrawal tax of every account.
+    """
+    best = rank_schedules(account_counts, first_withdrawal_years, tilts, caps, refine, **params).iloc[0]
+    final_wealth, balances, taxes = evaluate_schedules(
+        best['num_3a_accounts'], best['first_withdrawal_year'], best['split_rule'], best['split_parameter'],
+        return_details=True, **params)
+
+    num_accounts = int(best['num_3a_accounts'])
+    first_year = int(best['first_withdrawal_year'])
+    years = params.get('years', 42)
+    withdrawn = max(min(num_accounts, years - first_year + 1), 0)
+    return Schedule(
+        num_3a_accounts=num_accounts,
+        first_withdrawal_year=first_year,
+        split_rule=best['split_rule'],
+        split_parameter=float(best['split_parameter']),
+        withdrawal_years=list(range(first_year, first_year + withdrawn)),
+        withdrawal_balances=balances[0, :withdrawn].tolist(),
+        withdrawal_taxes=taxes[0, :withdrawn].tolist(),
+        final_wealth=final_wealth[0].item(),
+    )
+
+def schedule_final_wealth(schedule, **params):
+    """Final after-tax wealth of a schedule run through strategies.run_strategies (for cross-checks)."""
+    # A reference that never withdraws, so the schedule keeps all its withdrawals
+    strategy = schedule.to_strategy()
+    state = run_strategies([DirectInvestmentStrategy(), strategy], **params)[strategy.name]
+    remaining = sum(state.accounts)
+    return state.history[-1]['Wealth'] + remaining - calculate_saeule_3a_withdrawal_tax(remaining)
@@ -0,0 +1,279 @@
+"""Persistent on-disk cache of simulation results, keyed by a hash of parameters, tax tables and code."""
+import contextlib
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import investements_vs_saeule_3_a as model
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction runs without an inter-process lock
+    fcntl = None
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'SAEULE_3A_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'swiss-pension-analysis'))
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+FORMAT_VERSION = 1
+
+SIMULATION_SIGNATURE = inspect.signature(model.simulate_investment_strategies)
+
+def tax_table_version():
+    """Hash of the tax brackets and multipliers the simulation uses."""
+    tables = (model.WEALTH_TAX_FREIBETRAG, model.WEALTH_TAX_BRACKETS, model.WEALTH_TAX_TOP_RATE,
+              model.INCOME_TAX_BRACKETS, model.INCOME_TAX_TOP_RATE, model.SAEULE_3A_WITHDRAWAL_TAX_BRACKETS,
+              model.CANTON_MULTIPLIER, model.MUNICIPAL_MULTIPLIER)
+    return hashlib.sha256(repr(tables).encode()).hexdigest()[:16]
+
+def code_version():
+    """Hash of the simulation module's source, so any code change invalidates cached results."""
+    with open(model.__file__, 'rb') as stream:
+        return hashlib.sha256(stream.read()).hexdigest()[:16]
+
+def tax_cache_quanta():
+    """[wealth, income] key quanta of the active TaxCache, or None while taxes are computed exactly."""
+    cache = model.active_tax_cache()
+    if cache is None or (cache.wealth_quantum is None and cache.income_quantum is None):
+        return None
+    return [cache.wealth_quantum, cache.income_quantum]
+
+def _values(values):
+    """Encode a list of numbers as float64 plus a kind: 'int', 'float' or 'mixed' (with int flags)."""
+    is_int = [isinstance(value, int) for value in values]
+    kind = 'int' if all(is_int) else 'float' if not any(is_int) else 'mixed'
+    return np.array(values, dtype=float), kind, np.array(is_int, dtype=float) if kind == 'mixed' else None
+
+def _decode_values(array, kind, flags):
+    if kind == 'int':
+        return array.astype(np.int64).tolist()
+    values = array.tolist()
+    if kind == 'mixed':
+        for index in np.flatnonzero(flags).tolist():
+            values[index] = int(values[index])
+    return values
+
+def encode_results(results):
+    """Encode simulation results as one flat float64 array plus a JSON-serializable manifest.
+
+    Each history is stored column by column; records with a different set of
+    keys (e.g. withdrawals from 3a or from wealth) keep their own key order,
+    and Python ints stay ints when decoded.
+    """
+    segments = []
+    offset = 0
+
+    def add(array):
+        nonlocal offset
+        segments.append(array)
+        offset += len(array)
+        return [offset - len(array), len(array)]
+
+    manifest = {'format': FORMAT_VERSION, 'histories': []}
+    for records in results:
+        records = list(records)
+        layouts, layout_ids, fields = [], [], {}
+        for record in records:
+            keys = list(record)
+            if keys not in layouts:
+                layouts.append(keys)
+            layout_ids.append(layouts.index(keys))
+            for key in keys:
+                fields.setdefault(key, [])
+        for key, values in fields.items():
+            values.extend(record[key] for record in records if key in record)
+
+        columns = {}
+        for key, values in fields.items():
+            if key == 'Saeule_3a_Accounts':
+                flat = [balance for balances in values for balance in balances]
+                array, kind, flags = _values(flat)
+                columns[key] = {'ragged': add(np.array([len(balances) for balances in values], dtype=float)),
+                                'values': add(array), 'kind': kind, 'flags': add(flags) if flags is not None else None}
+            else:
+                array, kind, flags = _values(values)
+                columns[key] = {'values': add(array), 'kind': kind,
+                                'flags': add(flags) if flags is not None else None}
+        manifest['histories'].append({'layouts': layouts, 'layout_ids': layout_ids, 'columns': columns})
+
+    data = np.concatenate(segments) if segments else np.zeros(0)
+    return data, manifest
+
+def decode_results(data, manifest):
+    """Rebuild the tuple of YearIndexedHistory objects from encode_results output."""
+    # Plain ndarray view of the (memory-mapped) data; slicing a memmap is much slower
+    data = data.view(np.ndarray)
+
+    def segment(location):
+        return None if location is None else data[location[0]:location[0] + location[1]]
+
+    results = []
+    for entry in manifest['histories']:
+        columns = {}
+        for key, column in entry['columns'].items():
+            values = _decode_values(segment(column['values']), column['kind'], segment(column['flags']))
+            if 'ragged' in column:
+                flat, values, start = values, [], 0
+                for length in segment(column['ragged']).astype(np.int64).tolist():
+                    values.append(flat[start:start + length])
+                    start += length
+            columns[key] = values
+
+        layouts = entry['layouts']
+        if len(layouts) == 1:
+            keys = layouts[0]
+            records = [dict(zip(keys, row)) for row in zip(*(columns[key] for key in keys))]
+        else:
+            columns = {key: iter(values) for key, values in columns.items()}
+            records = [{key: next(columns[key]) for key in layouts[layout_id]} for layout_id in entry['layout_ids']]
+        results.append(model.YearIndexedHistory(records))
+    return tuple(results)
+
+class ResultCache:
+    """Content-addressed cache of simulate_investment_strategies results in a directory.
+
+    Each entry is a flat float64 .npy file (memory-mapped on load) plus a
+    small JSON manifest, named by the hash of the normalized parameters, the
+    tax table version, the code version and the quanta of an active
+    TaxCache, whose rounding changes the results. Files are written to a temporary
+    name and renamed into place, so concurrent processes never see a partial
+    entry; a hit refreshes the entry's access time and the least recently
+    used entries are removed once the directory exceeds `max_bytes`.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._versions = {'tax_tables': tax_table_version(), 'code': code_version()}
+
+    def key(self, params):
+        """Hash of the parameters (with defaults filled in), the tax table and code versions and the tax cache quanta."""
+        arguments = SIMULATION_SIGNATURE.bind(**params)
+        arguments.apply_defaults()
+        normalized = {name: value for name, value in arguments.arguments.items() if name != 'columnar'}
+        payload = json.dumps({'params': normalized, 'format': FORMAT_VERSION, 'tax_cache': tax_cache_quanta(),
+                              **self._versions},
+                             sort_keys=True, default=lambda value: value.tolist())
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.npy', base + '.json'
+
+    def get(self, params):
+        """Return the cached results for params, or None."""
+        data_path, manifest_path = self._paths(self.key(params))
+        try:
+            with open(manifest_path, encoding='utf-8') as stream:
+                manifest = json.load(stream)
+            data = np.load(data_path, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            # Missing, evicted by another process in between, or written by an older format
+            self.misses += 1
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(manifest_path)
+        self.hits += 1
+        return decode_results(data, manifest)
+
+    def put(self, params, results):
+        """Store results for params, then evict old entries if the cache is over its size limit."""
+        data_path, manifest_path = self._paths(self.key(params))
+        data, manifest = encode_results(results)
+        # The data file goes first: an entry counts as present once its manifest exists
+        self._write_atomic(data_path, lambda stream: np.save(stream, data))
+        self._write_atomic(manifest_path, lambda stream: stream.write(json.dumps(manifest).encode()))
+        self.evict()
+
+    def _write_atomic(self, path, write):
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as stream:
+                write(stream)
+            os.replace(temporary, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temporary)
+            raise
+
+    def simulate(self, columnar=False, **params):
+        """simulate_investment_strategies(**params), served from the cache when possible."""
+        results = self.get(params)
+        if results is None:
+            results = model.simulate_investment_strategies(**params)
+            self.put(params, results)
+        if columnar:
+            results = tuple(self._columnar(history, params) if idx < 6 else history
+                            for idx, history in enumerate(results))
+        return results
+
+    @staticmethod
+    def _columnar(records, params):
+        history = model.ColumnarHistory(params.get('years', 42))
+        for record in records:
+            history.append(record)
+        return history
+
+    def _entries(self):
+        """(access time, bytes, key) of every complete entry."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            data_path, manifest_path = self._paths(key)
+            try:
+                size = os.path.getsize(data_path) + os.path.getsize(manifest_path)
+                entries.append((os.path.getmtime(manifest_path), size, key))
+            except OSError:
+                continue
+        return entries
+
+    @contextlib.contextmanager
+    def _lock(self):
+        """Hold an exclusive lock on the cache directory (a no-op without fcntl)."""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _remove(self, key):
+        # Manifest first, so readers treat the entry as missing before its data goes
+        for path in reversed(self._paths(key)):
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        with self._lock():
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, key in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(key)
+                total -= size
+
+    def clear(self):
+        with self._lock():
+            for _, _, key in self._entries():
+                self._remove(key)
+
+    def stats(self):
+        """Return hit/miss counts of this instance and the entries and bytes on disk."""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(entries), 'bytes': sum(size for _, size, _ in entries)}
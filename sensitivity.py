@@ -0,0 +1,108 @@
+"""Sensitivity of final wealth to the simulation inputs, by batched central finite differences."""
+import inspect
+
+import numpy as np
+import pandas as pd
+
+from batch_simulation import ALICE, BOB, STRATEGY_NAMES, simulate_investment_strategies_batch
+
+DEFAULT_PARAMETERS = ('wealth_ter', 'saeule_3a_ter', 'wealth_growth_rate', 'initial_income')
+BATCH_DEFAULTS = {name: parameter.default for name, parameter
+                  in inspect.signature(simulate_investment_strategies_batch).parameters.items()}
+# Counts, years, step indices and seeds take whole values only and have no derivative
+DISCRETE_PARAMETERS = ('years', 'num_3a_accounts', 'spouse_3a_accounts', 'contribution_seed',
+                       'steps_per_year', 'withdrawal_step')
+# Parameters without a value of their own follow another one (bracket_indexation defaults to inflation)
+FOLLOWS = {'bracket_indexation': 'inflation'}
+DEFAULTS = {name: value for name, value in BATCH_DEFAULTS.items()
+            if name not in DISCRETE_PARAMETERS and type(value) in (int, float)}
+DEFAULTS.update({name: DEFAULTS[other] for name, other in FOLLOWS.items()})
+# Final wealth of Alice minus Bob's, reported next to the strategies
+ADVANTAGE = 'Alice_vs_Bob'
+
+def _final_wealth(result):
+    """(N, persons + 1) final wealth plus remaining 3a per strategy, and Alice's advantage over Bob."""
+    final_wealth = result['Wealth'][:, :, -1] + result['Saeule_3a'][:, :, -1]
+    return np.column_stack([final_wealth, final_wealth[:, ALICE] - final_wealth[:, BOB]])
+
+def _base_value(name, params):
+    """Value of `name` at the base point: given in params, else what it follows, else its default."""
+    if params.get(name) is not None:
+        return params[name]
+    if name in FOLLOWS:
+        return _base_value(FOLLOWS[name], params)
+    return DEFAULTS[name]
+
+def sensitivities(parameters=DEFAULT_PARAMETERS, relative_step=1e-4, **params):
+    """Partial derivatives and elasticities of final wealth with respect to `parameters`.
+
+    The base point and both shifted points of every parameter are simulated
+    together in one batched run (1 + 2k scenarios for k parameters) instead of
+    2k + 1 separate simulations. Each parameter is moved by relative_step
+    times its value (relative_step itself at zero) in both directions, and the
+    derivative is the central difference. The tax schedules are piecewise
+    linear, so near a bracket limit the result is the average slope across it.
+
+    Any parameter of simulate_investment_strategies_batch with a continuous
+    value can be differentiated (see DEFAULTS); counts, years and seeds
+    cannot. bracket_indexation follows inflation unless it is given or
+    differentiated itself. The remaining keyword arguments are passed to the
+    batched simulation. To evaluate several points at once, give any of them
+    as (P,) arrays; all P * (1 + 2k) scenarios still run as one batch.
+    Differentiated rates may also be (P, years) per-year paths. They are
+    shifted in parallel, every year by the same step scaled to the mean
+    absolute rate of the path, so the derivative is per unit added to every
+    year and Value and the elasticity refer to the path's mean.
+
+    Returns a DataFrame with one row per point, parameter and strategy (plus
+    Alice_vs_Bob, Alice's final wealth minus Bob's): the final wealth, the
+    derivative in CHF per unit of the parameter and the elasticity, the
+    relative change of final wealth per relative change of the parameter.
+    """
+    for name in parameters:
+        if name not in DEFAULTS:
+            raise ValueError(f"Cannot differentiate with respect to '{name}', "
+                             f"expected one of {', '.join(DEFAULTS)}")
+    values = {name: np.asarray(_base_value(name, params), dtype=float) for name in parameters}
+    for name, value in values.items():
+        if value.ndim > 2:
+            raise ValueError(f"'{name}' must be a scalar, (P,) or (P, years) array, got shape {value.shape}")
+    shapes = [np.shape(value)[:1] for value in params.values()] + [value.shape[:1] for value in values.values()]
+    points = np.broadcast_shapes(*shapes)[0] if any(shapes) else 1
+    per_point = 1 + 2 * len(parameters)
+
+    # Scenario p * per_point is point p's base, followed by the +/- shift of each parameter
+    batch_params = {name: np.repeat(np.broadcast_to(value, (points,) + np.shape(value)[1:]), per_point, axis=0)
+                    if np.ndim(value) else value for name, value in params.items()}
+    steps, levels = {}, {}
+    for position, name in enumerate(parameters):
+        base = np.broadcast_to(values[name], (points,) + values[name].shape[1:])
+        # A per-year path is measured by its mean and shifted in parallel
+        scale = np.abs(base).mean(axis=1) if base.ndim == 2 else np.abs(base)
+        levels[name] = base.mean(axis=1) if base.ndim == 2 else base
+        steps[name] = np.where(scale != 0, relative_step * scale, relative_step)
+        step = steps[name].reshape((points,) + (1,) * (base.ndim - 1))
+        shifted = np.repeat(base[:, None], per_point, axis=1)
+        shifted[:, 1 + 2 * position] += step
+        shifted[:, 2 + 2 * position] -= step
+        batch_params[name] = shifted.reshape((points * per_point,) + base.shape[1:])
+
+    final_wealth = _final_wealth(simulate_investment_strategies_batch(record_history=False, **batch_params))
+    final_wealth = final_wealth.reshape(points, per_point, -1)
+
+    base_wealth = final_wealth[:, 0]
+    names = STRATEGY_NAMES + [ADVANTAGE]
+    rows = []
+    for position, name in enumerate(parameters):
+        derivative = ((final_wealth[:, 1 + 2 * position] - final_wealth[:, 2 + 2 * position])
+                      / (2 * steps[name][:, None]))
+        base = levels[name][:, None]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            elasticity = np.where(base_wealth != 0, derivative * base / base_wealth, np.nan)
+        for point in range(points):
+            for column, strategy in enumerate(names):
+                rows.append({'Point': point, 'Parameter': name, 'Value': base[point, 0], 'Strategy': strategy,
+                             'Final_Wealth': base_wealth[point, column],
+                             'Derivative': derivative[point, column],
+                             'Elasticity': elasticity[point, column]})
+    return pd.DataFrame(rows)
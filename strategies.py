@@ -0,0 +1,473 @@
+"""Strategy plug-in API: run any set of 3a strategies through one shared year loop."""
+import hashlib
+from collections import namedtuple
+
+from investements_vs_saeule_3_a import (
+    TOTAL_MULTIPLIER,
+    ColumnarHistory,
+    YearIndexedHistory,
+    calculate_income_tax,
+    calculate_saeule_3a_withdrawal_tax,
+    calculate_wealth_tax,
+)
+
+# Quantities shared by all strategies in a given year, computed once by the kernel.
+# reference_withdrawal is the after-tax amount the reference strategy (Alice)
+# takes out this year; it is None while the reference strategy itself runs.
+YearContext = namedtuple('YearContext', [
+    'year', 'retirement_year', 'retired', 'income', 'investment', 'saeule_3a_contribution',
+    'wealth_growth_rate', 'saeule_3a_growth_rate', 'wealth_ter', 'saeule_3a_ter',
+    'reference_withdrawal', 'income_tax',
+])
+
+class StrategyState:
+    """Mutable per-strategy state advanced by the kernel."""
+
+    def __init__(self, initial_wealth, num_accounts, history):
+        self.wealth = initial_wealth
+        self.accounts = [0] * num_accounts
+        self.active = list(range(num_accounts))  # Open accounts, in withdrawal order
+        self.total_taxes = 0
+        self.history = history
+        self.withdrawals = YearIndexedHistory()
+
+    def copy(self):
+        """Return an independent copy of the state (used for checkpoints)."""
+        state = StrategyState.__new__(StrategyState)
+        state.wealth = self.wealth
+        state.accounts = self.accounts.copy()
+        state.active = self.active.copy()
+        state.total_taxes = self.total_taxes
+        state.history = self.history.copy()
+        state.withdrawals = self.withdrawals.copy()
+        return state
+
+class Strategy:
+    """Base class of a 3a strategy.
+
+    Subclasses describe a strategy through three rules: which accounts to
+    close in a year (withdrawal schedule), how many accounts to open
+    (account-opening rule) and how the yearly contribution is split over the
+    open accounts (contribution allocation). Taxes, TER, growth and matching
+    the reference withdrawal are handled by the shared kernel in
+    run_strategies.
+
+    The class attributes select where in the year the strategy's steps happen;
+    the defaults follow Alice, and the built-in strategies set them to
+    reproduce simulate_investment_strategies.
+    """
+
+    name = 'Strategy'
+    uses_saeule_3a = True
+    withdraw_after_growth = False          # Withdraw/match after growth instead of before taxes
+    taxed_in_retirement = True
+    saeule_3a_grows_in_retirement = True
+    wealth_grows_in_retirement = True
+    charge_ter_on_investment = False       # Apply the wealth TER to newly invested money
+
+    def initial_accounts(self):
+        """Number of 3a accounts open at the start."""
+        return 0
+
+    def accounts_to_close(self, ctx, state):
+        """Withdrawal schedule: indices of the accounts to withdraw this year."""
+        return []
+
+    def matches_reference(self, ctx, state):
+        """Whether to take the reference withdrawal out of wealth in a year without 3a withdrawals."""
+        return ctx.retired and ctx.reference_withdrawal > 0
+
+    def contribution(self, ctx, state):
+        """Yearly 3a contribution (deducted from taxable income and from the investment)."""
+        return ctx.saeule_3a_contribution if self.uses_saeule_3a else 0
+
+    def accounts_to_open(self, ctx, state, amount):
+        """Account-opening rule: number of new accounts to open before allocating `amount`."""
+        return 0
+
+    def allocate_contribution(self, ctx, state, amount, new_accounts=()):
+        """Contribution allocation: {account index: amount}, split evenly over open accounts by default.
+
+        `new_accounts` lists the accounts opened this year by accounts_to_open.
+        """
+        if not state.active:
+            return {}
+        per_account = amount / len(state.active)
+        return {acc_idx: per_account for acc_idx in state.active}
+
+    def checkpoint_key(self, year, retirement_year):
+        """Settings that can affect this strategy in years 1..year (part of its checkpoint key).
+
+        By default every attribute counts; subclasses leave out settings that
+        only take effect later, so checkpoints stay valid when those change.
+        """
+        return (type(self).__qualname__, sorted(vars(self).items()))
+
+class DirectInvestmentStrategy(Strategy):
+    """Bob: invests everything directly, no Säule 3a."""
+
+    uses_saeule_3a = False
+    withdraw_after_growth = True
+    charge_ter_on_investment = True
+
+    def __init__(self, name='Bob'):
+        self.name = name
+
+class StaggeredWithdrawalStrategy(Strategy):
+    """Fixed number of accounts, closed `accounts_per_year` at a time from `first_withdrawal_year`.
+
+    The first withdrawal year defaults to the retirement year. Alice is
+    StaggeredWithdrawalStrategy('Alice', 11, first_withdrawal_year=32), Dominic
+    uses 5 accounts from retirement on.
+    """
+
+    def __init__(self, name, num_accounts, first_withdrawal_year=None, accounts_per_year=1):
+        self.name = name
+        self.num_accounts = num_accounts
+        self.first_withdrawal_year = first_withdrawal_year
+        self.accounts_per_year = accounts_per_year
+
+    def initial_accounts(self):
+        return self.num_accounts
+
+    def accounts_to_close(self, ctx, state):
+        first_year = self.first_withdrawal_year or ctx.retirement_year
+        if ctx.year < first_year:
+            return []
+        return state.active[:self.accounts_per_year]
+
+    def checkpoint_key(self, year, retirement_year):
+        # The withdrawal settings do not matter before the first withdrawal
+        if year < (self.first_withdrawal_year or retirement_year):
+            settings = {name: value for name, value in vars(self).items()
+                        if name not in ('first_withdrawal_year', 'accounts_per_year')}
+            return (type(self).__qualname__, sorted(settings.items()))
+        return super().checkpoint_key(year, retirement_year)
+
+class SingleAccountStrategy(Strategy):
+    """Charly: one account, withdrawn in full in the first retirement year."""
+
+    def __init__(self, name='Charly'):
+        self.name = name
+
+    def initial_accounts(self):
+        return 1
+
+    def accounts_to_close(self, ctx, state):
+        # Like simulate_investment_strategies, only when there is a withdrawal to match
+        if ctx.year == ctx.retirement_year and ctx.reference_withdrawal > 0:
+            return state.active[:1]
+        return []
+
+class ThresholdAccountsStrategy(Strategy):
+    """Emily: fills one account up to a threshold, then opens the next; one withdrawal per retirement year."""
+
+    withdraw_after_growth = True
+    taxed_in_retirement = False
+    saeule_3a_grows_in_retirement = False
+
+    def __init__(self, name='Emily', account_threshold=50000):
+        self.name = name
+        self.account_threshold = account_threshold
+
+    def initial_accounts(self):
+        return 1
+
+    def accounts_to_close(self, ctx, state):
+        return state.active[:1] if ctx.retired else []
+
+    def accounts_to_open(self, ctx, state, amount):
+        remaining_space = self.account_threshold - state.accounts[state.active[-1]]
+        if remaining_space > 0:
+            return 1 if amount - min(amount, remaining_space) > 0 else 0
+        return 1
+
+    def allocate_contribution(self, ctx, state, amount, new_accounts=()):
+        if not new_accounts:
+            return {state.active[-1]: amount}
+        # Top up the previous account to the threshold, the rest goes to the new one
+        previous_account = [acc_idx for acc_idx in state.active if acc_idx not in new_accounts][-1]
+        new_account = new_accounts[0]
+        remaining_space = self.account_threshold - state.accounts[previous_account]
+        if remaining_space > 0:
+            contribution = min(amount, remaining_space)
+            return {previous_account: contribution, new_account: amount - contribution}
+        return {new_account: amount}
+
+class AccumulateOnlyStrategy(StaggeredWithdrawalStrategy):
+    """Alice_adjusted: contributes like Alice but never withdraws; frozen in retirement."""
+
+    taxed_in_retirement = False
+    saeule_3a_grows_in_retirement = False
+    wealth_grows_in_retirement = False
+
+    def __init__(self, name='Alice_adjusted', num_accounts=11):
+        super().__init__(name, num_accounts)
+
+    def accounts_to_close(self, ctx, state):
+        return []
+
+    def matches_reference(self, ctx, state):
+        return False
+
+def default_strategies(num_3a_accounts=11):
+    """The six strategies of simulate_investment_strategies, Alice first as the reference."""
+    return [
+        StaggeredWithdrawalStrategy('Alice', num_3a_accounts, first_withdrawal_year=32),
+        DirectInvestmentStrategy('Bob'),
+        SingleAccountStrategy('Charly'),
+        StaggeredWithdrawalStrategy('Dominic', 5),
+        ThresholdAccountsStrategy('Emily'),
+        AccumulateOnlyStrategy('Alice_adjusted', num_3a_accounts),
+    ]
+
+class CheckpointStore:
+    """Per-strategy snapshots of the simulation state, for resuming changed runs.
+
+    run_strategies saves each strategy's state after every year in `years`
+    (None: every year) under a hash of everything that can affect that
+    strategy up to that year: the simulation parameters, the strategy's
+    checkpoint_key, the reference strategy's checkpoint_key and the
+    retirement year once it has been reached. A later run whose settings only
+    differ in things that take effect after a checkpoint (retirement year,
+    withdrawal schedule) resumes from it instead of starting in year 1.
+    At most `maxsize` snapshots are kept, the oldest are dropped first.
+    """
+
+    def __init__(self, years=None, maxsize=10000):
+        self.years = None if years is None else frozenset(years)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._snapshots = {}
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    def saves(self, year):
+        return self.years is None or year in self.years
+
+    def save(self, key, state, reference_withdrawals):
+        if key in self._snapshots:
+            return
+        if len(self._snapshots) >= self.maxsize:
+            del self._snapshots[next(iter(self._snapshots))]
+        self._snapshots[key] = (state.copy(), list(reference_withdrawals))
+
+    def load(self, key):
+        """Return a copy of the (state, reference withdrawals) stored under key, or None."""
+        snapshot = self._snapshots.get(key)
+        if snapshot is None:
+            return None
+        state, reference_withdrawals = snapshot
+        return state.copy(), list(reference_withdrawals)
+
+    def stats(self):
+        """Return hit/miss counts (one lookup per strategy and run) and the number of snapshots."""
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._snapshots),
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        self._snapshots.clear()
+
+def _checkpoint_key(parameters, strategies, idx, reference, year, retirement_year):
+    """Hash of everything that can affect strategy idx in years 1..year."""
+    parts = [parameters, year, retirement_year if retirement_year <= year else None,
+             strategies[idx].checkpoint_key(year, retirement_year)]
+    if idx != reference:
+        # Other strategies match the reference strategy's withdrawals
+        parts.append(strategies[reference].checkpoint_key(year, retirement_year))
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+def _withdraw(strategy, state, ctx):
+    """Close scheduled accounts or match the reference withdrawal; return (after-tax withdrawn, matched)."""
+    closing = list(strategy.accounts_to_close(ctx, state))
+    if closing:
+        after_tax_total = 0
+        for acc_idx in closing:
+            account_balance = state.accounts[acc_idx]
+            withdrawal_tax = calculate_saeule_3a_withdrawal_tax(account_balance)
+            after_tax_amount = account_balance - withdrawal_tax
+            after_tax_total += after_tax_amount
+            state.withdrawals.append({
+                'Year': ctx.year,
+                'Account': acc_idx + 1,
+                'Balance': account_balance,
+                'Tax': withdrawal_tax,
+                'After_Tax': after_tax_amount
+            })
+            state.accounts[acc_idx] = 0
+            state.active.remove(acc_idx)
+
+        if not ctx.retired:
+            # Before retirement withdrawals are reinvested
+            state.wealth += after_tax_total
+            return after_tax_total, 0
+        # In retirement the reference withdrawal is spent, any excess goes to wealth
+        matched = after_tax_total if ctx.reference_withdrawal is None else ctx.reference_withdrawal
+        state.wealth += (after_tax_total - matched)
+        return after_tax_total, matched
+
+    if ctx.reference_withdrawal is not None and strategy.matches_reference(ctx, state):
+        state.wealth -= ctx.reference_withdrawal
+        return 0, ctx.reference_withdrawal
+    return 0, 0
+
+def _step(strategy, state, ctx):
+    """Advance one strategy by one year; return its after-tax 3a withdrawal."""
+    retired = ctx.retired
+    withdrawn, matched = 0, 0
+    if not strategy.withdraw_after_growth:
+        withdrawn, matched = _withdraw(strategy, state, ctx)
+
+    # Taxes; income tax is shared by all strategies with the same taxable income
+    contribution = strategy.contribution(ctx, state)
+    if not retired or strategy.taxed_in_retirement:
+        taxable_income = ctx.income - contribution
+        if taxable_income not in ctx.income_tax:
+            ctx.income_tax[taxable_income] = calculate_income_tax(taxable_income)
+        tax = (ctx.income_tax[taxable_income] + calculate_wealth_tax(state.wealth)) * TOTAL_MULTIPLIER
+        state.total_taxes += tax
+        state.wealth -= tax
+    else:
+        tax = 0
+
+    # Säule 3a growth, account opening and contributions
+    if not retired or strategy.saeule_3a_grows_in_retirement:
+        for acc_idx in state.active:
+            state.accounts[acc_idx] = state.accounts[acc_idx] * (1 - ctx.saeule_3a_ter)
+            state.accounts[acc_idx] = state.accounts[acc_idx] * (1 + ctx.saeule_3a_growth_rate)
+    if not retired and strategy.uses_saeule_3a:
+        new_accounts = []
+        for _ in range(strategy.accounts_to_open(ctx, state, contribution)):
+            state.accounts.append(0)
+            new_accounts.append(len(state.accounts) - 1)
+            state.active.append(new_accounts[-1])
+        allocation = strategy.allocate_contribution(ctx, state, contribution, new_accounts=new_accounts)
+        for acc_idx, amount in allocation.items():
+            state.accounts[acc_idx] += amount * (1 - ctx.saeule_3a_ter)
+
+    # Apply TER and growth to regular wealth
+    if not retired or strategy.wealth_grows_in_retirement:
+        state.wealth = state.wealth * (1 - ctx.wealth_ter)
+        state.wealth = state.wealth * (1 + ctx.wealth_growth_rate)
+        if strategy.charge_ter_on_investment:
+            state.wealth += ctx.investment * (1 - ctx.wealth_ter)
+        else:
+            state.wealth += ctx.investment - contribution
+
+    if strategy.withdraw_after_growth:
+        withdrawn, matched = _withdraw(strategy, state, ctx)
+
+    state.history.append({
+        'Year': ctx.year,
+        'Wealth': state.wealth,
+        'Saeule_3a': sum(state.accounts),
+        'Saeule_3a_Accounts': state.accounts.copy(),
+        'Active_Accounts': len(state.active),
+        'Yearly_Tax': tax,
+        'Cumulative_Tax': state.total_taxes,
+        'Withdrawal': matched,
+        '3a_Contribution': contribution
+    })
+    return withdrawn
+
+def run_strategies(strategies=None, initial_income=100000, initial_wealth=120000,
+                   yearly_investment=20000, saeule_3a_contribution=7258,
+                   wealth_growth_rate=0.04, saeule_3a_growth_rate=0.04,
+                   wealth_ter=0.001, saeule_3a_ter=0.004, years=42, num_3a_accounts=11,
+                   retirement_year=37, reference=0, columnar=False, checkpoints=None):
+    """Run a list of strategies through one shared year-stepping kernel.
+
+    Each year the shared quantities (income, investment, 3a contribution
+    limit, income tax per taxable income) are computed once. The reference
+    strategy (index `reference`, Alice by default) is stepped first and its
+    after-tax 3a withdrawal becomes the amount every other strategy has to
+    match in retirement. Without `strategies` the six strategies of
+    simulate_investment_strategies are used, reproducing its yearly Wealth,
+    Saeule_3a and Cumulative_Tax and Alice's withdrawal log for the standard
+    42-year horizon. The records differ from the legacy output in two ways:
+    every strategy reports its own Yearly_Tax (simulate_investment_strategies
+    reports Dominic's tax for Charly, which differs from the retirement year
+    on), and all strategies share one record schema. History records carry
+    'Withdrawal' (the matched reference withdrawal) and '3a_Contribution'
+    instead of the per-person keys, and `withdrawals` holds one record per
+    closed account (Year, Account, Balance, Tax, After_Tax) where the legacy
+    logs of Charly, Dominic and Emily hold yearly Amount/From_3a/To_Wealth
+    entries.
+
+    With a CheckpointStore as `checkpoints`, each strategy resumes from its
+    latest matching snapshot and new snapshots are saved along the way, so
+    what-if runs that only change late-phase settings skip the shared years.
+
+    Returns a dict mapping each strategy name to its StrategyState, whose
+    `history` and `withdrawals` hold the per-year records.
+    """
+    if strategies is None:
+        strategies = default_strategies(num_3a_accounts)
+
+    states = []
+    for strategy in strategies:
+        num_accounts = strategy.initial_accounts()
+        history = ColumnarHistory(years, num_accounts) if columnar else YearIndexedHistory()
+        states.append(StrategyState(initial_wealth, num_accounts, history))
+    order = [reference] + [idx for idx in range(len(strategies)) if idx != reference]
+
+    # Last year already covered by each strategy's state, and the reference withdrawal of every year so far
+    completed = [0] * len(strategies)
+    reference_withdrawals = []
+    if checkpoints is not None:
+        parameters = (initial_income, initial_wealth, yearly_investment, saeule_3a_contribution,
+                      wealth_growth_rate, saeule_3a_growth_rate, wealth_ter, saeule_3a_ter, columnar)
+        for idx in range(len(strategies)):
+            for year in range(years, 0, -1):
+                if not checkpoints.saves(year):
+                    continue
+                snapshot = checkpoints.load(
+                    _checkpoint_key(parameters, strategies, idx, reference, year, retirement_year))
+                if snapshot is not None:
+                    states[idx], withdrawals = snapshot
+                    completed[idx] = year
+                    if idx == reference:
+                        reference_withdrawals = withdrawals
+                    break
+            if completed[idx]:
+                checkpoints.hits += 1
+            else:
+                checkpoints.misses += 1
+
+    for year in range(min(completed) + 1, years + 1):
+        retired = year >= retirement_year
+        ctx = YearContext(
+            year=year,
+            retirement_year=retirement_year,
+            retired=retired,
+            income=0 if retired else initial_income,
+            investment=0 if retired else yearly_investment,
+            saeule_3a_contribution=0 if retired else saeule_3a_contribution,
+            wealth_growth_rate=wealth_growth_rate,
+            saeule_3a_growth_rate=saeule_3a_growth_rate,
+            wealth_ter=wealth_ter,
+            saeule_3a_ter=saeule_3a_ter,
+            reference_withdrawal=None,
+            income_tax={},
+        )
+        for idx in order:
+            if year <= completed[idx]:
+                # Restored from a checkpoint; the reference withdrawal was saved with it
+                if idx == reference:
+                    ctx = ctx._replace(reference_withdrawal=reference_withdrawals[year - 1])
+                continue
+            withdrawn = _step(strategies[idx], states[idx], ctx)
+            if idx == reference:
+                reference_withdrawals.append(withdrawn)
+                ctx = ctx._replace(reference_withdrawal=withdrawn)
+
+        if checkpoints is not None and checkpoints.saves(year):
+            for idx in range(len(strategies)):
+                if year > completed[idx]:
+                    checkpoints.save(_checkpoint_key(parameters, strategies, idx, reference, year, retirement_year),
+                                     states[idx], reference_withdrawals if idx == reference else ())
+
+    return {strategy.name: state for strategy, state in zip(strategies, states)}
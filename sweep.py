@@ -0,0 +1,78 @@
+"""Parallel parameter sweeps over simulate_investment_strategies."""
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from headless import run_batch
+from result_cache import ResultCache
+
+def expand_grid(grid):
+    """Expand a {parameter: values} grid into a list of keyword-argument dicts."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def run_combinations(combinations, cache_dir=None):
+    """Simulate each parameter combination and return its parameters plus summary metrics."""
+    cache = ResultCache(cache_dir) if cache_dir else None
+    return list(run_batch(combinations, cache=cache))
+
+def _print_progress(completed, total):
+    """Default progress reporter."""
+    print(f"\rSweep progress: {completed:,}/{total:,} combinations ({completed / total:.0%})",
+          end='\n' if completed == total else '', flush=True)
+
+def run_parameter_sweep(grid, max_workers=None, chunk_size=None, progress=None, cache_dir=None):
+    """Run simulate_investment_strategies over every combination of a parameter grid.
+
+    `grid` maps keyword arguments of simulate_investment_strategies to the
+    values to sweep, e.g. {'num_3a_accounts': range(1, 16), 'saeule_3a_ter':
+    [0.002, 0.004]}. Combinations are split into chunks of `chunk_size` and
+    spread over a ProcessPoolExecutor with `max_workers` processes (default:
+    all cores); max_workers=1 runs in the current process. Results stream back
+    as chunks finish and are returned as one DataFrame in grid order.
+
+    `progress` is either True for a printed progress line or a callable
+    receiving (completed, total) after every chunk. With `cache_dir`, every
+    worker reads and writes results through a ResultCache in that directory.
+
+    On platforms that spawn worker processes, call this from under an
+    `if __name__ == "__main__":` guard.
+    """
+    combinations = expand_grid(grid)
+    total = len(combinations)
+    if total == 0:
+        return pd.DataFrame(columns=list(grid))
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if chunk_size is None:
+        # A few chunks per worker keeps all workers busy without much scheduling overhead
+        chunk_size = max(1, math.ceil(total / (max_workers * 4)))
+    if progress is True:
+        progress = _print_progress
+
+    chunks = [(start, combinations[start:start + chunk_size]) for start in range(0, total, chunk_size)]
+    chunk_rows = {}
+    completed = 0
+
+    if max_workers == 1:
+        for start, chunk in chunks:
+            chunk_rows[start] = run_combinations(chunk, cache_dir)
+            completed += len(chunk)
+            if progress:
+                progress(completed, total)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run_combinations, chunk, cache_dir): (start, len(chunk)) for start, chunk in chunks}
+            for future in as_completed(futures):
+                start, size = futures[future]
+                chunk_rows[start] = future.result()
+                completed += size
+                if progress:
+                    progress(completed, total)
+
+    rows = [row for start in sorted(chunk_rows) for row in chunk_rows[start]]
+    return pd.DataFrame(rows)
@@ -0,0 +1,226 @@
+"""Canton and municipality tax tables loaded from data files and evaluated for many municipalities at once."""
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch_simulation import STRATEGY_NAMES, simulate_investment_strategies_batch
+from investements_vs_saeule_3_a import JOINT_INCOME_SPLITTING_DIVISOR, _compile_brackets
+
+# Bundled tables: one JSON file per canton in cantons/ plus municipalities.csv
+TAX_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tax_data')
+MUNICIPALITY_COLUMNS = ('bfs_number', 'municipality', 'canton', 'municipal_multiplier')
+
+def load_canton(path):
+    """Load one canton's tax table from a JSON file.
+
+    Income brackets are (upper limit, rate in percent) and wealth brackets are
+    (bracket size, rate in permille), as in the module constants of
+    investements_vs_saeule_3_a. The wealth exemption is a threshold, not a
+    deduction: wealth up to it is untaxed, and wealth above it is taxed
+    through the brackets from zero. An optional income_tax
+    joint_splitting_divisor sets the married couples' tariff. The Säule 3a
+    withdrawal brackets are (upper threshold, flat rate on the whole amount).
+    """
+    with open(path, encoding='utf-8') as stream:
+        canton = json.load(stream)
+    for key in ('canton', 'canton_multiplier', 'income_tax', 'wealth_tax', 'saeule_3a_withdrawal_tax'):
+        if key not in canton:
+            raise ValueError(f"{path}: missing '{key}'")
+    return canton
+
+def load_municipalities(path):
+    """Load municipalities (BFS number, name, canton and multiplier) from a CSV file."""
+    with open(path, encoding='utf-8', newline='') as stream:
+        reader = csv.DictReader(stream)
+        missing = [column for column in MUNICIPALITY_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+        return [{
+            'bfs_number': int(row['bfs_number']),
+            'municipality': row['municipality'],
+            'canton': row['canton'],
+            'municipal_multiplier': float(row['municipal_multiplier']),
+        } for row in reader]
+
+def _stack(tables, pad_columns):
+    """Stack per-canton arrays into one (cantons, columns) array, padding each row."""
+    width = max(len(table) for table in tables)
+    stacked = np.full((len(tables), width), pad_columns, dtype=float)
+    for row, table in enumerate(tables):
+        stacked[row, :len(table)] = table
+    return stacked
+
+def _compile_canton_brackets(compiled):
+    """Stack compiled bracket tables of several cantons; upper limits are padded with inf."""
+    upper_limits, lower_bounds, rates, cumulative_tax = zip(*compiled)
+    return (_stack(upper_limits, np.inf), _stack(lower_bounds, 0.0),
+            _stack(rates, 0.0), _stack(cumulative_tax, 0.0))
+
+def _evaluate_canton_brackets(values, cantons, table):
+    """Evaluate stacked bracket tables, each value with the table of its canton."""
+    upper_limits, lower_bounds, rates, cumulative_tax = table
+    # Number of upper limits below the value, like searchsorted(side='left') per canton
+    bracket = (upper_limits[cantons] < values[..., None]).sum(axis=-1)
+    return cumulative_tax[cantons, bracket] + (values - lower_bounds[cantons, bracket]) * rates[cantons, bracket]
+
+class TaxTables:
+    """Compiled tax tables of several cantons and their municipalities.
+
+    Every canton's brackets are compiled once into cumulative arrays and stacked
+    into (cantons, brackets) arrays, so taxes for any mix of municipalities are
+    evaluated in one vectorized call. Municipalities are addressed by their
+    position in `municipalities` (see index()).
+    """
+
+    def __init__(self, cantons, municipalities, version=None):
+        self.cantons = sorted(cantons)
+        canton_position = {code: position for position, code in enumerate(self.cantons)}
+        unknown = sorted({row['canton'] for row in municipalities} - set(canton_position))
+        if unknown:
+            raise ValueError(f"No tax table for canton(s) {', '.join(unknown)}")
+        self.municipalities = pd.DataFrame(list(municipalities), columns=list(MUNICIPALITY_COLUMNS))
+        self.version = version
+
+        tables = [cantons[code] for code in self.cantons]
+        self.canton_index = np.array([canton_position[code] for code in self.municipalities['canton']], dtype=int)
+        canton_multipliers = np.array([table['canton_multiplier'] for table in tables], dtype=float)
+        self.multipliers = (canton_multipliers[self.canton_index]
+                            + self.municipalities['municipal_multiplier'].to_numpy(dtype=float))
+
+        self._income_table = _compile_canton_brackets([_compile_brackets(
+            [limit for limit, _ in table['income_tax']['brackets']],
+            [rate for _, rate in table['income_tax']['brackets']],
+            table['income_tax']['top_rate'], 100) for table in tables])
+        self._wealth_table = _compile_canton_brackets([_compile_brackets(
+            np.cumsum([size for size, _ in table['wealth_tax']['brackets']]).tolist(),
+            [rate for _, rate in table['wealth_tax']['brackets']],
+            table['wealth_tax']['top_rate'], 1000) for table in tables])
+        self._joint_divisors = np.array([table['income_tax'].get('joint_splitting_divisor',
+                                                                 JOINT_INCOME_SPLITTING_DIVISOR)
+                                         for table in tables], dtype=float)
+        self._wealth_exemptions = np.array([table['wealth_tax'].get('exemption', 0) for table in tables],
+                                           dtype=float)
+
+        # Rates repeat the top rate past the last threshold, which also covers the padded columns
+        withdrawal_brackets = [table['saeule_3a_withdrawal_tax']['brackets'] for table in tables]
+        width = max(len(brackets) for brackets in withdrawal_brackets) + 1
+        self._withdrawal_thresholds = _stack([[threshold for threshold, _ in brackets]
+                                              for brackets in withdrawal_brackets], np.inf)
+        self._withdrawal_rates = np.array([[rate for _, rate in brackets]
+                                           + [brackets[-1][1]] * (width - len(brackets))
+                                           for brackets in withdrawal_brackets], dtype=float)
+
+    def __len__(self):
+        return len(self.municipalities)
+
+    def index(self, municipalities):
+        """Positions of municipalities given by BFS number or name (scalar or array-like)."""
+        keys = np.asarray(municipalities)
+        column = 'municipality' if keys.dtype.kind in 'UO' else 'bfs_number'
+        positions = pd.Index(self.municipalities[column]).get_indexer(keys.ravel())
+        if (positions < 0).any():
+            unknown = keys.ravel()[positions < 0]
+            raise ValueError(f"Unknown municipality {', '.join(map(str, unknown[:5]))}")
+        return positions.reshape(keys.shape)
+
+    def _positions(self, values, municipalities):
+        """Broadcast values against municipality positions; None means every municipality on a new last axis."""
+        values = np.asarray(values, dtype=float)
+        if municipalities is None:
+            return values[..., None], np.arange(len(self))
+        return np.broadcast_arrays(values, np.asarray(municipalities, dtype=int))
+
+    def income_tax(self, incomes, municipalities=None):
+        """Base income tax (before multipliers) in each municipality's canton."""
+        incomes, positions = self._positions(incomes, municipalities)
+        tax = _evaluate_canton_brackets(incomes, self.canton_index[positions], self._income_table)
+        return np.where(incomes > 0, tax, 0.0)
+
+    def wealth_tax(self, wealths, municipalities=None):
+        """Base wealth tax (before multipliers) in each municipality's canton."""
+        wealths, positions = self._positions(wealths, municipalities)
+        cantons = self.canton_index[positions]
+        tax = _evaluate_canton_brackets(wealths, cantons, self._wealth_table)
+        return np.where(wealths > self._wealth_exemptions[cantons], tax, 0.0)
+
+    def total_tax(self, incomes, wealths, municipalities=None, joint=False):
+        """Income plus wealth tax times the canton and municipal multipliers.
+
+        `municipalities` holds positions broadcast against incomes and wealths;
+        None evaluates every municipality along a new last axis. With `joint`
+        the incomes are married couples' joint incomes, taxed by splitting with
+        each canton's divisor.
+        """
+        incomes, wealths = np.broadcast_arrays(np.asarray(incomes, dtype=float), np.asarray(wealths, dtype=float))
+        incomes, positions = self._positions(incomes, municipalities)
+        wealths, _ = self._positions(wealths, municipalities)
+        if joint:
+            divisors = self._joint_divisors[self.canton_index[positions]]
+            income_tax = self.income_tax(incomes / divisors, positions) * divisors
+        else:
+            income_tax = self.income_tax(incomes, positions)
+        return (income_tax + self.wealth_tax(wealths, positions)) * self.multipliers[positions]
+
+    def withdrawal_tax(self, amounts, municipalities=None, year_totals=None):
+        """Säule 3a withdrawal tax with each municipality's canton schedule.
+
+        The rate is set by `year_totals`, the sums of all withdrawals of the
+        same tax year, when given (see calculate_saeule_3a_withdrawal_tax).
+        """
+        amounts, positions = self._positions(amounts, municipalities)
+        if year_totals is None:
+            rate_base = amounts
+        else:
+            rate_base = np.broadcast_to(self._positions(year_totals, municipalities)[0], amounts.shape)
+        cantons = self.canton_index[positions]
+        bracket = (self._withdrawal_thresholds[cantons] < rate_base[..., None]).sum(axis=-1)
+        return amounts * self._withdrawal_rates[cantons, bracket]
+
+def load_tax_tables(directory=TAX_DATA_DIR):
+    """Load and compile every canton table in `directory`/cantons and the municipalities CSV.
+
+    The version is a hash of the data files, so results computed with the
+    tables can be tied to the exact data they used.
+    """
+    canton_dir = os.path.join(directory, 'cantons')
+    municipalities_path = os.path.join(directory, 'municipalities.csv')
+    paths = sorted(os.path.join(canton_dir, name) for name in os.listdir(canton_dir) if name.endswith('.json'))
+
+    digest = hashlib.sha256()
+    for path in paths + [municipalities_path]:
+        with open(path, 'rb') as stream:
+            digest.update(os.path.basename(path).encode() + b'\0' + stream.read())
+
+    cantons = {}
+    for path in paths:
+        canton = load_canton(path)
+        cantons[canton['canton']] = canton
+    return TaxTables(cantons, load_municipalities(municipalities_path), version=digest.hexdigest()[:16])
+
+def rank_municipalities(income, wealth, tables=None):
+    """Total tax on one income and wealth in every municipality, lowest first."""
+    tables = tables or load_tax_tables()
+    ranking = tables.municipalities.copy()
+    ranking['Total_Tax'] = tables.total_tax(income, wealth)
+    ranking['Effective_Rate'] = ranking['Total_Tax'] / income if income else np.nan
+    return ranking.sort_values('Total_Tax', kind='stable').reset_index(drop=True)
+
+def rank_residences(tables=None, strategy='Alice', **params):
+    """Final wealth and cumulative tax of a strategy in every municipality, best first.
+
+    All municipalities are simulated together as one batch (one scenario per
+    municipality); `params` are passed on to simulate_investment_strategies_batch.
+    """
+    tables = tables or load_tax_tables()
+    person = STRATEGY_NAMES.index(strategy)
+    result = simulate_investment_strategies_batch(tax_tables=tables, record_history=False, **params)
+    ranking = tables.municipalities.copy()
+    ranking['Final_Wealth'] = result['Wealth'][:, person, -1]
+    ranking['Final_Saeule_3a'] = result['Saeule_3a'][:, person, -1]
+    ranking['Cumulative_Tax'] = result['Cumulative_Tax'][:, person, -1]
+    ranking['Total'] = ranking['Final_Wealth'] + ranking['Final_Saeule_3a']
+    return ranking.sort_values('Total', ascending=False, kind='stable').reset_index(drop=True)